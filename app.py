@@ -1,49 +1,83 @@
-import streamlit as st
-
-# --- IMPORTACIÓN DE VISTAS (MÓDULOS) ---
-from views.home import show_home
-from views.lineas import show_lineas
-from views.correlacion import show_correlacion
-from views.temporal import show_temporal
-
-# --- CONFIGURACIÓN GLOBAL DE LA PÁGINA ---
-# Esto debe ser lo primero que se ejecute en la app
-st.set_page_config(
-    page_title="Tablero Metrobus CDMX",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# --- MENÚ DE NAVEGACIÓN (SIDEBAR) ---
-st.sidebar.title("Navegación")
-
-# Selector de Vistas
-pagina = st.sidebar.radio(
-    "Ir a:", 
-    [
-        "Inicio (General)", 
-        "Detalle por Línea", 
-        "Correlación, PCA y Clustering",
-        "Análisis Espectral (Fourier)"
-    ],
-    index=0
-)
-
-st.sidebar.divider()
-
-# --- ENRUTADOR (ROUTER) ---
-# Decide qué función ejecutar según la selección del usuario
-
-if pagina == "Inicio (General)":
-    show_home()
-
-elif pagina == "Detalle por Línea":
-    show_lineas()
-
-elif pagina == "Correlación, PCA y Clustering":
-    show_correlacion()
-
-elif pagina == "Análisis Espectral (Fourier)":
-    show_temporal()
-
-
+import streamlit as st
+import importlib
+from uuid import uuid4
+import pandas as pd
+from motor.perfilado import etapa, iniciar_rerun, finalizar_rerun
+from motor.sql import USAR_SQL, cargar_base
+from utils import cargar_datos_con_reporte
+
+# --- VISTAS (MÓDULOS) ---
+# Cada vista se importa la primera vez que se abre su pagina: scikit-learn y scipy
+# solo se cargan si el usuario entra a Correlacion o a Fourier.
+VISTAS = {
+    "Inicio (General)": ("views.home", "show_home"),
+    "Detalle por Línea": ("views.lineas", "show_lineas"),
+    "Correlación, PCA y Clustering": ("views.correlacion", "show_correlacion"),
+    "Análisis Espectral (Fourier)": ("views.temporal", "show_temporal"),
+    "Pronóstico de Afluencia": ("views.pronostico", "show_pronostico"),
+    "Comparativo Anual": ("views.comparativo", "show_comparativo"),
+}
+
+# --- CONFIGURACIÓN GLOBAL DE LA PÁGINA ---
+# Esto debe ser lo primero que se ejecute en la app
+st.set_page_config(
+    page_title="Tablero Metrobus CDMX",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# --- MENÚ DE NAVEGACIÓN (SIDEBAR) ---
+st.sidebar.title("Navegación")
+
+# Selector de Vistas
+pagina = st.sidebar.radio(
+    "Ir a:", 
+    list(VISTAS),
+    index=0
+)
+
+st.sidebar.divider()
+
+# --- ENRUTADOR (ROUTER) ---
+# Decide qué función ejecutar según la selección del usuario
+# Cada rerun completo se cronometra por etapas (ver motor/perfilado.py)
+iniciar_rerun(pagina, st.session_state.setdefault("sesion_id", uuid4().hex))
+# importlib guarda el modulo en sys.modules: solo el primer acceso paga la importacion
+modulo, funcion = VISTAS[pagina]
+with etapa(f"importar:{modulo}"):
+    vista = getattr(importlib.import_module(modulo), funcion)
+vista()
+
+# --- HUELLA DE MEMORIA DEL DATASET ---
+st.sidebar.divider()
+try:
+    if USAR_SQL:
+        # Con el backend embebido la tabla no se carga en memoria: se reporta el archivo
+        reporte = cargar_base().reporte()
+        st.sidebar.caption(f"Backend {reporte['motor']}: archivo de {reporte['archivo_mb']:.2f} MB")
+    else:
+        _, _, memoria = cargar_datos_con_reporte()
+        st.sidebar.caption(
+            f"Memoria del dataset: {memoria['compacto_mb']:.2f} MB "
+            f"(CSV sin compactar: {memoria['original_mb']:.2f} MB, "
+            f"ahorro {memoria['ahorro_pct']:.0f}%)"
+        )
+except Exception as e:
+    # La vista ya reporto el error de carga; aqui solo se indica que no hay medicion
+    st.sidebar.caption(f"Memoria del dataset no disponible: {e}")
+
+# --- TIEMPOS POR ETAPA ---
+perfil = finalizar_rerun()
+if st.sidebar.checkbox("Mostrar tiempos", value=False):
+    mem = perfil["memoria_cache"]
+    st.sidebar.caption(
+        f"Rerun: {perfil['total_s'] * 1000:,.0f} ms | Caches: {mem['entradas']} entradas, "
+        f"{mem['mb']:,.1f} de {mem['limite_mb']:,.0f} MB"
+    )
+    df_etapas = pd.DataFrame(perfil["etapas"])
+    if not df_etapas.empty:
+        df_etapas = df_etapas.groupby("etapa", sort=False)["segundos"].sum().mul(1000).round(1).rename("ms").reset_index()
+        st.sidebar.dataframe(df_etapas, hide_index=True, use_container_width=True)
+    if perfil["cache"]:
+        df_cache = pd.DataFrame.from_dict(perfil["cache"], orient="index").rename_axis("cache").reset_index()
+        st.sidebar.dataframe(df_cache, hide_index=True, use_container_width=True)
@@ -0,0 +1,274 @@
+"""Benchmark headless de los calculos de cada vista (sin levantar la app; los modulos
+importan streamlit solo por los decoradores de cache y aqui se llaman las funciones puras).
+
+Uso:
+    python benchmark.py                       # escalas 1x, 10x y 100x
+    python benchmark.py --escalas 1 10        # solo algunas escalas
+    python benchmark.py --escalas 1000        # ~22M filas: se generan y compactan bloque por bloque
+    python benchmark.py --guardar-baseline    # guarda los tiempos como referencia
+    python benchmark.py --tolerancia 0.25     # falla si una etapa es >25% mas lenta que la referencia
+    python benchmark.py --solo-importaciones  # solo el reporte de tiempos de importacion
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from generar_datos import GeneradorAfluencia
+from utils import ROOT_DIR, RUTA_CSV, leer_csv, compactar_tipos, canonizar_lineas, concatenar
+from motor.consultas import IndiceAfluencia
+from motor.cubo import CuboAfluencia
+from motor.muestreo import ANCHO_PAGINA_PX, reducir_matriz, reducir_serie
+from motor.estadisticas import dia_semana, histograma, resumen_caja
+from motor.kpis import TablaKPI
+from motor.correlacion import (
+    caracteristicas, ajustar_barrido, regresion_pares, correlacion_movil,
+    perfiles, proyectar_perfiles, ajustar_barrido_perfiles
+)
+from motor.espectral import matriz_series, espectro, espectrograma, ciclos_dominantes, periodos
+from motor.pronostico import matriz_pago, ajustar_modelos, predecir
+from motor.anomalias import DetectorAnomalias
+from motor.comparativo import ComparativoAnual
+
+RUTA_BASELINE = os.path.join(ROOT_DIR, "benchmark_baseline.json")
+
+
+# --- DATOS ESCALADOS ---
+def bloques_crudos(factor, semilla=42):
+    """Bloques crudos (como el CSV): el real para 1x y uno sintetico con `factor` veces mas lineas si no.
+
+    Con la misma semilla cada llamada genera los mismos bloques, asi la ingesta se puede repetir
+    sin guardar nunca la tabla cruda completa.
+    """
+    if factor == 1:
+        yield pd.read_csv(RUTA_CSV)
+        return
+    yield from GeneradorAfluencia(n_lineas=7 * factor, n_tipos_pago=2, semilla=semilla).bloques()
+
+
+# --- ETAPAS POR VISTA ---
+def etapa_ingesta(ctx):
+    # Cada bloque se compacta antes de generar el siguiente, como en leer_csv; el tiempo
+    # incluye leer o generar los bloques crudos
+    ctx["df"] = canonizar_lineas(concatenar([compactar_tipos(b) for b in bloques_crudos(ctx["escala"])]))
+
+
+def etapa_indice(ctx):
+    ctx["indice"] = IndiceAfluencia(ctx["df"])
+
+
+def etapa_cubo(ctx):
+    ctx["cubo"] = CuboAfluencia(ctx["df"])
+
+
+def etapa_home(ctx):
+    cubo = ctx["cubo"]
+    cubo.dias_con_datos()
+    cubo.total_por_linea()
+    reducir_matriz(cubo.matriz_lineas(), ANCHO_PAGINA_PX * 2 // 3)
+    cubo.total_por_pago()
+    cubo.linea_por_pago()
+
+
+def etapa_lineas(ctx):
+    indice, cubo = ctx["indice"], ctx["cubo"]
+    linea = indice.lineas[0]
+    ini, fin = indice.rango_fechas()
+    df_linea = indice.query([linea], ini, fin)
+    TablaKPI(cubo.serie_por_linea(), cubo.lineas).por_linea([linea], ini, fin)
+    reducir_serie(cubo.serie_diaria([linea], ini, fin), ANCHO_PAGINA_PX)
+    valores = df_linea["afluencia"].to_numpy()
+    histograma(valores)
+    resumen_caja(valores)
+    resumen_caja(valores, dia_semana(df_linea["fecha"].to_numpy()), n_grupos=7)
+
+
+def etapa_correlacion(ctx):
+    cubo = ctx["cubo"]
+    regresion_pares(cubo.matriz_lineas())
+    _, X_scaled, _ = caracteristicas(cubo)
+    ajustar_barrido(X_scaled)
+
+
+def etapa_perfiles(ctx):
+    cubo = ctx["cubo"]
+    Z, _ = proyectar_perfiles(perfiles(cubo.serie_por_linea()).to_numpy())
+    ajustar_barrido_perfiles(Z)
+    # Paso mensual: a 100x la salida diaria seria un arreglo (D, 700, 700) de varios GB
+    correlacion_movil(cubo.matriz_lineas(), paso=30)
+
+
+def etapa_temporal(ctx):
+    fechas, nombres, Y = matriz_series(ctx["cubo"])
+    freqs, magnitud = espectro(Y)
+    ciclos_dominantes({"freqs": freqs, "magnitud": magnitud, "periodos": periodos(freqs), "nombres": nombres})
+    espectrograma(Y[:, 0], 90, 7)
+
+
+def etapa_pronostico(ctx):
+    dias, _, Y, M = matriz_pago(ctx["cubo"])
+    predecir(ajustar_modelos(dias, Y, M))
+
+
+def etapa_anomalias(ctx):
+    dias, claves, Y, M = matriz_pago(ctx["cubo"])
+    DetectorAnomalias(claves).procesar(dias, Y, M).anomalias()
+
+
+def etapa_comparativo(ctx):
+    cubo = ctx["cubo"]
+    comp = ComparativoAnual(cubo.serie_por_linea(), cubo.lineas)
+    anio, semana = comp.ultima_semana()
+    comp.comparar_semana(anio, semana)
+    comp.comparar_mes(anio, 1)
+    comp.crecimiento(anio)
+    comp.recuperacion(int(comp.anios[0]))
+
+
+ETAPAS = [
+    ("ingesta", etapa_ingesta),
+    ("indice", etapa_indice),
+    ("cubo", etapa_cubo),
+    ("home", etapa_home),
+    ("lineas", etapa_lineas),
+    ("correlacion", etapa_correlacion),
+    ("perfiles", etapa_perfiles),
+    ("temporal", etapa_temporal),
+    ("pronostico", etapa_pronostico),
+    ("anomalias", etapa_anomalias),
+    ("comparativo", etapa_comparativo),
+]
+
+
+# --- VERIFICACION ---
+def verificar_kpis(ctx, n_consultas=20, semilla=0):
+    """Compara TablaKPI.sistema con el calculo original en pandas (filtrar filas, sumar, nunique)."""
+    df, tabla = ctx["df"], TablaKPI(ctx["cubo"].serie_por_linea(), ctx["cubo"].lineas)
+    fechas = np.sort(df["fecha"].unique())
+    rng = np.random.default_rng(semilla)
+    for _ in range(n_consultas):
+        lineas = list(rng.choice(tabla.lineas, rng.integers(1, len(tabla.lineas) + 1), replace=False))
+        ini, fin = np.sort(rng.choice(fechas, 2))
+        df_f = df[df["linea"].isin(lineas) & df["fecha"].between(ini, fin)]
+        kpis = tabla.sistema(lineas, ini, fin)
+        assert np.isclose(kpis["total"], df_f["afluencia"].sum()), (lineas, ini, fin)
+        assert kpis["dias"] == df_f["fecha"].nunique(), (lineas, ini, fin)
+
+
+# --- MEDICION ---
+def medir(fn, ctx):
+    # tracemalloc distorsiona los tiempos: primero se cronometra y luego se repite para la memoria
+    t0 = time.perf_counter()
+    fn(ctx)
+    segundos = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(ctx)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return segundos, pico
+
+
+def correr(escalas):
+    resultados = []
+    base, _ = leer_csv(RUTA_CSV)
+
+    # La carga del CSV solo se mide sobre el archivo real
+    segundos, pico = medir(lambda ctx: leer_csv(RUTA_CSV), {})
+    resultados.append({"escala": 1, "etapa": "carga_csv", "filas": len(base), "segundos": segundos,
+                       "pico_mb": pico / 1e6, "filas_s": len(base) / segundos})
+
+    for escala in escalas:
+        ctx = {"escala": escala}
+        for nombre, fn in ETAPAS:
+            segundos, pico = medir(fn, ctx)
+            filas = len(ctx["df"])  # la ingesta es la primera etapa
+            resultados.append({"escala": escala, "etapa": nombre, "filas": filas, "segundos": segundos,
+                               "pico_mb": pico / 1e6, "filas_s": filas / segundos if segundos else float("inf")})
+            print(f"  {escala:>5}x {nombre:<12} {segundos:9.4f} s  {pico / 1e6:9.1f} MB", file=sys.stderr)
+        verificar_kpis(ctx)
+        del ctx
+    return pd.DataFrame(resultados)
+
+
+# --- TIEMPOS DE IMPORTACION ---
+# Cada modulo se importa en un interprete nuevo para medir el arranque en frio.
+MODULOS_ARRANQUE = ["streamlit", "pandas", "plotly.express", "utils",
+                    "views.home", "views.lineas", "views.correlacion", "views.temporal", "views.pronostico",
+                    "views.comparativo"]
+DEPENDENCIAS_PESADAS = ["sklearn", "scipy", "statsmodels"]
+
+_SCRIPT_IMPORTACION = """
+import json, sys, time
+t0 = time.perf_counter()
+import {modulo}
+segundos = time.perf_counter() - t0
+print(json.dumps({{"segundos": segundos, "pesadas": [m for m in {pesadas!r} if m in sys.modules]}}))
+"""
+
+
+def medir_importaciones(modulos=MODULOS_ARRANQUE):
+    filas = []
+    for modulo in modulos:
+        salida = subprocess.run(
+            [sys.executable, "-c", _SCRIPT_IMPORTACION.format(modulo=modulo, pesadas=DEPENDENCIAS_PESADAS)],
+            cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        )
+        datos = json.loads(salida.stdout.strip().splitlines()[-1])
+        filas.append({"modulo": modulo, "segundos": datos["segundos"], "arrastra": ", ".join(datos["pesadas"]) or "-"})
+    return pd.DataFrame(filas)
+
+
+def comparar(df, baseline, tolerancia):
+    ref = {(r["escala"], r["etapa"]): r["segundos"] for r in baseline}
+    df["baseline_s"] = [ref.get((e, n), np.nan) for e, n in zip(df["escala"], df["etapa"])]
+    df["ratio"] = df["segundos"] / df["baseline_s"]
+    df["regresion"] = df["ratio"] > 1 + tolerancia
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de las etapas de calculo del tablero")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--baseline", default=RUTA_BASELINE)
+    parser.add_argument("--guardar-baseline", action="store_true")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    parser.add_argument("--solo-importaciones", action="store_true")
+    args = parser.parse_args(argv)
+
+    df_imp = medir_importaciones()
+    with pd.option_context("display.width", 160, "display.float_format", "{:,.3f}".format):
+        print("Importacion en frio (interprete nuevo por modulo):")
+        print(df_imp.to_string(index=False))
+        print()
+    if args.solo_importaciones:
+        return 0
+
+    df = correr(args.escalas)
+
+    if args.guardar_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(df[["escala", "etapa", "segundos"]].to_dict("records"), f, indent=2)
+        print(f"Baseline guardado en {args.baseline}")
+
+    hay_regresion = False
+    if os.path.exists(args.baseline) and not args.guardar_baseline:
+        with open(args.baseline) as f:
+            df = comparar(df, json.load(f), args.tolerancia)
+        hay_regresion = bool(df["regresion"].any())
+
+    with pd.option_context("display.max_rows", None, "display.width", 160, "display.float_format", "{:,.4f}".format):
+        print(df.to_string(index=False))
+
+    if hay_regresion:
+        print(f"\nREGRESION: etapas mas de {args.tolerancia:.0%} por encima del baseline")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Generador de datos sinteticos con la forma del CSV de afluencia del Metrobus.
+
+Escribe el mismo esquema (fecha, mes, anio, linea, tipo_pago, afluencia) con ciclo semanal,
+efecto quincena, tendencia de recuperacion, dias festivos, aperturas de lineas y huecos.
+La salida se genera por bloques de dias, asi que la memoria no depende del tamaño total.
+
+Uso:
+    python generar_datos.py bench/sintetico.csv --lineas 200 --tipos-pago 6 --inicio 2015-01-01 --fin 2025-12-31
+
+No escribas la salida dentro de data/: el tablero ingiere como particion todo CSV bajo esa carpeta.
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from utils import MESES
+from motor.calendario import festivos
+
+TIPOS_PAGO = ["Prepago", "Gratuidad", "Tarjeta CDMX", "QR", "Efectivo", "Transbordo"]
+PARTICIPACION_PAGO = np.array([0.80, 0.08, 0.05, 0.03, 0.02, 0.02])
+
+# Lunes..Domingo: entre semana lleno, fin de semana con caida marcada
+FACTOR_SEMANAL = np.array([1.00, 1.03, 1.04, 1.04, 1.06, 0.70, 0.45])
+
+class GeneradorAfluencia:
+    def __init__(self, n_lineas=7, n_tipos_pago=2, inicio="2021-01-01", fin="2025-11-30",
+                 prob_hueco=0.002, semilla=42):
+        self.rng = np.random.default_rng(semilla)
+        self.inicio, self.fin = pd.Timestamp(inicio), pd.Timestamp(fin)
+        self.lineas = [f"Linea {i + 1}" for i in range(n_lineas)]
+        n_tipos_pago = min(n_tipos_pago, len(TIPOS_PAGO))
+        self.tipos_pago = TIPOS_PAGO[:n_tipos_pago]
+        self.participacion = PARTICIPACION_PAGO[:n_tipos_pago] / PARTICIPACION_PAGO[:n_tipos_pago].sum()
+        self.prob_hueco = prob_hueco
+
+        # Parametros fijos por linea
+        L = n_lineas
+        self.nivel = self.rng.lognormal(mean=np.log(80_000), sigma=0.7, size=L)
+        self.crecimiento = self.rng.normal(0.03, 0.02, size=L)  # tendencia anual
+        self.semanal = FACTOR_SEMANAL[None, :] * self.rng.normal(1, 0.03, size=(L, 7))
+        self.quincena = self.rng.uniform(0.03, 0.08, size=L)
+        # Una parte de las lineas abre despues del inicio del periodo
+        total_dias = (self.fin - self.inicio).days + 1
+        abre_tarde = self.rng.random(L) < 0.2
+        self.apertura = np.where(abre_tarde, self.rng.integers(0, max(total_dias, 1), size=L), 0)
+
+    @property
+    def filas_estimadas(self):
+        dias = (self.fin - self.inicio).days + 1
+        return dias * len(self.lineas) * len(self.tipos_pago)
+
+    def bloque(self, fechas):
+        """DataFrame crudo (como el CSV) para los dias de `fechas`."""
+        f = pd.DatetimeIndex(fechas)
+        D, L, P = len(f), len(self.lineas), len(self.tipos_pago)
+        t = (f - self.inicio).days.to_numpy()
+        dow = f.dayofweek.to_numpy()
+        dia, fin_mes = f.day.to_numpy(), f.days_in_month.to_numpy()
+
+        # Recuperacion post-pandemia (sube rapido y luego se estabiliza) + tendencia propia de cada linea
+        recuperacion = 1 - 0.5 * np.exp(-t / 365)
+        tendencia = (1 + self.crecimiento[None, :]) ** (t[:, None] / 365)
+        semanal = self.semanal[:, dow].T
+        es_quincena = ((dia >= 14) & (dia <= 16)) | (dia >= fin_mes - 1)
+        quincena = 1 + self.quincena[None, :] * es_quincena[:, None]
+        festivo = np.where(festivos(f), 0.4, 1.0)
+
+        por_linea = self.nivel[None, :] * recuperacion[:, None] * tendencia * semanal * quincena * festivo[:, None]
+        ruido = self.rng.lognormal(0, 0.06, size=(D, L, P))
+        afluencia = np.rint(por_linea[:, :, None] * self.participacion[None, None, :] * ruido)
+
+        # Filas presentes: la linea ya abrio y el dia no es un hueco de captura
+        presente = (t[:, None] >= self.apertura[None, :]) & (self.rng.random((D, L)) >= self.prob_hueco)
+        d, l, p = np.nonzero(np.broadcast_to(presente[:, :, None], (D, L, P)))
+        # Las cadenas se formatean una vez por dia/linea/tipo y se indexan por fila
+        return pd.DataFrame({
+            "fecha": np.asarray(f.strftime("%Y-%m-%d"))[d],
+            "mes": np.array(MESES)[f.month.to_numpy()[d] - 1],
+            "anio": f.year.to_numpy()[d],
+            "linea": np.array(self.lineas)[l],
+            "tipo_pago": np.array(self.tipos_pago)[p],
+            "afluencia": afluencia[d, l, p],
+        })
+
+    def bloques(self, dias_por_bloque=31):
+        fechas = pd.date_range(self.inicio, self.fin, freq="D")
+        for i in range(0, len(fechas), dias_por_bloque):
+            yield self.bloque(fechas[i:i + dias_por_bloque])
+
+    def escribir(self, ruta, dias_por_bloque=31):
+        """Escribe el CSV bloque por bloque; devuelve el numero de filas escritas."""
+        filas = 0
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with open(ruta, "w", newline="") as f:
+            for i, df in enumerate(self.bloques(dias_por_bloque)):
+                df.to_csv(f, header=(i == 0), index=False, float_format="%.1f")
+                filas += len(df)
+        return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera datos sinteticos de afluencia del Metrobus")
+    parser.add_argument("salida", help="ruta del CSV (fuera de data/, que el tablero ingiere completo)")
+    parser.add_argument("--lineas", type=int, default=7)
+    parser.add_argument("--tipos-pago", type=int, default=2)
+    parser.add_argument("--inicio", default="2021-01-01")
+    parser.add_argument("--fin", default="2025-11-30")
+    parser.add_argument("--prob-hueco", type=float, default=0.002)
+    parser.add_argument("--dias-por-bloque", type=int, default=31)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    gen = GeneradorAfluencia(args.lineas, args.tipos_pago, args.inicio, args.fin, args.prob_hueco, args.semilla)
+    print(f"Generando ~{gen.filas_estimadas:,} filas en {args.salida} ...")
+    filas = gen.escribir(args.salida, args.dias_por_bloque)
+    print(f"Listo: {filas:,} filas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from motor.cubo import cubo_por_version
+from motor.perfilado import cache_medido
+from motor.pronostico import matriz_pago
+
+# --- DETECCION DE ANOMALIAS EN LINEA ---
+# Cada serie (linea x tipo de pago) guarda, por dia de la semana, una media y una varianza
+# exponenciales de log(1 + afluencia). Un dia nuevo se califica contra ese estado (z) y luego
+# lo actualiza: O(1) por serie, sin volver a recorrer la historia. El residuo se recorta antes
+# de actualizar (Huber), asi un cierre o un festivo no contamina la referencia de las semanas
+# siguientes. Al arrancar, toda la matriz fecha x serie se procesa semana por semana: cada paso
+# actualiza los 7 dias de la semana de todas las series a la vez.
+
+ALFA = 0.1            # peso de cada observacion nueva (~10 semanas de memoria por dia de la semana)
+UMBRAL_Z = 3.5
+MIN_OBS = 4           # observaciones del mismo dia de la semana antes de empezar a marcar
+LIMITE_HUBER = 2.5    # en desviaciones estandar
+VAR_MINIMA = 1e-4     # piso de la varianza en log (~1% de variacion diaria)
+
+
+def dia_semana_de(dias):
+    """Lunes = 0 para dias enteros desde 1970-01-01 (que fue jueves)."""
+    return (np.asarray(dias, dtype=np.int64) + 3) % 7
+
+
+class DetectorAnomalias:
+    def __init__(self, claves):
+        S = len(claves)
+        self.claves = claves.reset_index(drop=True)
+        self.media = np.zeros((7, S))
+        self.varianza = np.zeros((7, S))
+        self.n = np.zeros((7, S), dtype=np.int64)
+        self.ultimo_dia = None
+        self.dias_procesados = 0
+        self.totales = np.zeros(S)  # huella de lo ya procesado, para saber si se puede extender
+        self._eventos = []          # (dias, serie, z, valor, esperado) de los puntos marcados
+
+    def copia(self):
+        otro = DetectorAnomalias.__new__(DetectorAnomalias)
+        otro.__dict__.update(self.__dict__)
+        for campo in ("media", "varianza", "n", "totales"):
+            setattr(otro, campo, getattr(self, campo).copy())
+        otro._eventos = list(self._eventos)
+        return otro
+
+    def _paso(self, dias, Y, M):
+        """Califica y actualiza un grupo de dias con dia de la semana distinto (a lo mas 7)."""
+        w = dia_semana_de(dias)
+        x = np.log1p(np.maximum(Y, 0))
+        media, n = self.media[w], self.n[w]
+        sd = np.sqrt(np.maximum(self.varianza[w], VAR_MINIMA))
+        delta = x - media
+        z = delta / sd
+        listo = M & (n >= MIN_OBS)
+        marcado = listo & (np.abs(z) > UMBRAL_Z)
+
+        # Las primeras observaciones promedian (alfa = 1/(n+1)); despues domina ALFA
+        a = np.maximum(ALFA, 1.0 / (n + 1))
+        delta = np.where(listo, np.clip(delta, -LIMITE_HUBER * sd, LIMITE_HUBER * sd), delta)
+        self.media[w] = np.where(M, media + a * delta, media)
+        self.varianza[w] = np.where(M, (1 - a) * (self.varianza[w] + a * delta ** 2), self.varianza[w])
+        self.n[w] = n + M
+
+        d, s = np.nonzero(marcado)
+        if len(d):
+            self._eventos.append((np.asarray(dias)[d], s, z[d, s], Y[d, s], np.expm1(media[d, s])))
+
+    def procesar(self, dias, Y, M):
+        """Procesa dias consecutivos (Y y M con forma (dias, series)) posteriores a `ultimo_dia`."""
+        dias = np.asarray(dias, dtype=np.int64)
+        if not len(dias):
+            return self
+        if self.ultimo_dia is not None and dias[0] <= self.ultimo_dia:
+            raise ValueError("Los dias nuevos deben ser posteriores al ultimo procesado")
+        for i in range(0, len(dias), 7):
+            self._paso(dias[i:i + 7], Y[i:i + 7], M[i:i + 7])
+        self.ultimo_dia = int(dias[-1])
+        self.dias_procesados += len(dias)
+        self.totales += np.where(M, Y, 0).sum(axis=0)
+        return self
+
+    def agregar_dia(self, dia, valores, mascara):
+        """Actualizacion en linea de un solo dia (valores y mascara con forma (series,))."""
+        return self.procesar([dia], np.asarray(valores, dtype=np.float64)[None], np.asarray(mascara, dtype=bool)[None])
+
+    def anomalias(self):
+        """Puntos marcados en formato largo: fecha, linea, tipo_pago, z, afluencia, esperado."""
+        if not self._eventos:
+            dias, serie, z, valor, esperado = (np.zeros(0, dtype=t) for t in (np.int64, np.int64, float, float, float))
+        else:
+            dias, serie, z, valor, esperado = (np.concatenate(p) for p in zip(*self._eventos))
+        return pd.DataFrame({
+            "fecha": pd.to_datetime(dias.astype("datetime64[D]")),
+            "linea": self.claves["linea"].to_numpy()[serie],
+            "tipo_pago": self.claves["tipo_pago"].to_numpy()[serie],
+            "z": z,
+            "afluencia": valor,
+            "esperado": esperado,
+        })
+
+
+# Ultimo detector construido: si la version nueva solo agrega dias al final, se copia su
+# estado y se procesan unicamente los dias nuevos
+_previo = {}
+
+
+def _extensible(previo, dias, claves, Y, M):
+    k = previo.dias_procesados
+    return (
+        previo.claves.equals(claves) and 0 < k < len(dias)
+        and int(dias[k - 1]) == previo.ultimo_dia
+        and np.allclose(np.where(M[:k], Y[:k], 0).sum(axis=0), previo.totales)
+    )
+
+
+@cache_medido(recurso=True)
+def detector_por_version(version):
+    dias, claves, Y, M = matriz_pago(cubo_por_version(version))
+    previo = _previo.get("detector")
+    if previo is not None and _extensible(previo, dias, claves, Y, M):
+        k = previo.dias_procesados
+        detector = previo.copia().procesar(dias[k:], Y[k:], M[k:])
+    else:
+        detector = DetectorAnomalias(claves).procesar(dias, Y, M)
+    _previo["detector"] = detector
+    return detector
+
+
+@cache_medido()
+def anomalias_por_version(version):
+    return detector_por_version(version).anomalias()
+
+
+def marcas_por_linea(anomalias, lineas=None, inicio=None, fin=None):
+    """Un punto por (fecha, linea) con los tipos de pago anomalos y el z de mayor magnitud."""
+    sel = anomalias
+    if lineas is not None:
+        sel = sel[sel["linea"].isin(lineas)]
+    if inicio is not None:
+        sel = sel[sel["fecha"] >= pd.Timestamp(inicio)]
+    if fin is not None:
+        sel = sel[sel["fecha"] <= pd.Timestamp(fin)]
+    sel = sel.assign(abs_z=sel["z"].abs()).sort_values("abs_z", ascending=False)
+    grupos = sel.groupby(["fecha", "linea"], sort=True)
+    return pd.DataFrame({
+        "z": grupos["z"].first(),
+        "tipos_pago": grupos["tipo_pago"].agg(", ".join),
+    }).reset_index()
+
+
+def ubicar_marcas(marcas, df_ancho):
+    """Agrega a cada marca el valor graficado (tabla ancha: indice = fecha, columnas = lineas)."""
+    filas = df_ancho.index.get_indexer(marcas["fecha"])
+    cols = df_ancho.columns.get_indexer(marcas["linea"])
+    ok = (filas >= 0) & (cols >= 0)
+    return marcas[ok].assign(afluencia=df_ancho.to_numpy()[filas[ok], cols[ok]])
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+# --- CALENDARIO DE CDMX ---
+# Festivos que mueven la afluencia: los usa el generador sintetico y los modelos de pronostico.
+
+# (mes, dia) de festivos fijos en CDMX
+FESTIVOS_FIJOS = [(1, 1), (5, 1), (9, 16), (11, 2), (12, 12), (12, 25)]
+
+
+def festivos(fechas):
+    """Mascara de festivos: fijos + lunes de asueto (1er lunes feb, 3er lunes mar y nov)."""
+    f = pd.DatetimeIndex(fechas)
+    mes, dia, dow = f.month.to_numpy(), f.day.to_numpy(), f.dayofweek.to_numpy()
+    es = np.zeros(len(f), dtype=bool)
+    for m, d in FESTIVOS_FIJOS:
+        es |= (mes == m) & (dia == d)
+    semana_del_mes = (dia - 1) // 7 + 1
+    es |= (dow == 0) & (mes == 2) & (semana_del_mes == 1)
+    es |= (dow == 0) & np.isin(mes, [3, 11]) & (semana_del_mes == 3)
+    return es
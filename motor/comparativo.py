@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+from motor.calendario import festivos
+from motor.cubo import cubo_por_version
+from motor.perfilado import cache_medido
+from utils import version_datos
+
+# --- COMPARATIVO ANUAL ALINEADO AL CALENDARIO ---
+# La afluencia de cada linea (y del sistema) se acomoda una sola vez en un arreglo
+# (entidad, año ISO, semana ISO, dia de la semana): el lunes de la semana 12 de 2025 queda
+# frente al lunes de la semana 12 de 2024, aunque las fechas no coincidan. Con los festivos
+# marcados en el mismo arreglo, los deltas YoY/MoM, los mapas de crecimiento y las curvas
+# de recuperacion son indexaciones y sumas sobre ejes, sin groupbys sobre las filas.
+
+SEMANAS_ISO = 53
+SISTEMA = "Sistema"
+
+
+class ComparativoAnual:
+    def __init__(self, df_largo, lineas=None):
+        """`df_largo`: fecha, linea, afluencia (una fila por dia y linea con datos)."""
+        codigos = pd.Categorical(df_largo["linea"], categories=lineas)
+        self.lineas = list(codigos.categories)
+        self.entidades = self.lineas + [SISTEMA]
+        self._pos = {l: i for i, l in enumerate(self.entidades)}
+        dias = df_largo["fecha"].to_numpy().astype("datetime64[D]")
+        if len(dias):
+            calendario = np.arange(dias.min(), dias.max() + 1)
+        else:
+            calendario = np.arange(np.datetime64("1970-01-01"), np.datetime64("1970-01-01"))
+
+        iso = pd.DatetimeIndex(calendario).isocalendar()
+        iso_anio, iso_sem, iso_dia = (iso[c].to_numpy(dtype=np.int64) for c in ("year", "week", "day"))
+        self.anios = np.unique(iso_anio)
+        a, s, d = iso_anio - (self.anios[0] if len(self.anios) else 0), iso_sem - 1, iso_dia - 1
+        forma = (len(self.anios), SEMANAS_ISO, 7)
+
+        self.fechas = np.full(forma, np.datetime64("NaT"), dtype="datetime64[D]")
+        self.fechas[a, s, d] = calendario
+        self.festivo = np.zeros(forma, dtype=bool)
+        self.festivo[a, s, d] = festivos(calendario)
+        self.lunes = np.full(forma[:2], np.datetime64("NaT"), dtype="datetime64[D]")
+        self.lunes[a, s] = calendario - d
+
+        # (entidad, año, semana, dia); NaN = sin dato. La ultima entidad es el sistema completo
+        fila = (dias - calendario[0]).astype(np.int64) if len(dias) else np.zeros(0, dtype=np.int64)
+        self.valores = np.full((len(self.entidades),) + forma, np.nan)
+        self.valores[codigos.codes, a[fila], s[fila], d[fila]] = df_largo["afluencia"].to_numpy(dtype=np.float64)
+        lineas_v = self.valores[:-1]
+        hay = ~np.isnan(lineas_v)
+        self.valores[-1] = np.where(hay.any(axis=0), np.where(hay, lineas_v, 0).sum(axis=0), np.nan)
+
+        # Sumas semanales alineadas contra el mismo dia de la semana del año ISO anterior,
+        # con y sin festivos (en cualquiera de los dos años)
+        self._alineado = {excluir: self._alinear(excluir) for excluir in (False, True)}
+
+        # Meses calendario (no ISO) para MoM y YoY mensual: total y dias con datos
+        meses = calendario.astype("datetime64[M]").astype(np.int64)
+        self.mes_inicio = int(meses.min()) if len(meses) else 0
+        n_meses = int(meses.max()) - self.mes_inicio + 1 if len(meses) else 0
+        m = meses - self.mes_inicio
+        plano = self.valores[:, a, s, d]  # (entidad, dia del calendario)
+        self.total_mes = np.zeros((len(self.entidades), n_meses))
+        self.dias_mes = np.zeros((len(self.entidades), n_meses), dtype=np.int64)
+        np.add.at(self.total_mes.T, m, np.nan_to_num(plano).T)
+        np.add.at(self.dias_mes.T, m, (~np.isnan(plano)).T)
+
+    def _alinear(self, excluir_festivos):
+        actual, previo = self.valores[:, 1:], self.valores[:, :-1]
+        par = ~np.isnan(actual) & ~np.isnan(previo)
+        if excluir_festivos:
+            par &= ~(self.festivo[1:] | self.festivo[:-1])
+        return {
+            "actual": np.where(par, actual, 0).sum(axis=-1),    # (entidad, año - 1, semana)
+            "anterior": np.where(par, previo, 0).sum(axis=-1),
+            "dias": par.sum(axis=-1),
+        }
+
+    def _ids(self, lineas=None):
+        nombres = self.entidades if lineas is None else [l for l in lineas if l in self._pos]
+        return nombres, np.array([self._pos[l] for l in nombres], dtype=np.int64)
+
+    def _anio(self, anio):
+        i = int(np.searchsorted(self.anios, anio))
+        if i >= len(self.anios) or self.anios[i] != anio:
+            raise KeyError(f"Año ISO sin datos: {anio}")
+        return i
+
+    def ultima_semana(self):
+        """(año ISO, semana ISO) de la ultima semana completa con datos del sistema."""
+        completa = (~np.isnan(self.valores[-1])).all(axis=-1)
+        a, s = np.nonzero(completa)
+        if not len(a):
+            return None
+        j = np.lexsort((s, a))[-1]
+        return int(self.anios[a[j]]), int(s[j]) + 1
+
+    def semanas(self, anio):
+        """Semanas ISO del año con al menos un dia en el calendario."""
+        return [int(s) + 1 for s in np.flatnonzero(~np.isnat(self.lunes[self._anio(anio)]))]
+
+    def comparar_semana(self, anio, semana, lineas=None, excluir_festivos=False):
+        """Total de la semana ISO contra la misma semana del año anterior, solo en dias alineados."""
+        nombres, ids = self._ids(lineas)
+        y, w = self._anio(anio), semana - 1
+        festivos_sem = int(self.festivo[y, w].sum())
+        festivos_ant = int(self.festivo[y - 1, w].sum()) if y > 0 else 0
+        if y == 0:
+            actual = anterior = np.full(len(ids), np.nan)
+            dias = np.zeros(len(ids), dtype=np.int64)
+        else:
+            al = self._alineado[excluir_festivos]
+            actual, anterior, dias = al["actual"][ids, y - 1, w], al["anterior"][ids, y - 1, w], al["dias"][ids, y - 1, w]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = np.where((dias > 0) & (anterior > 0), 100 * (actual / anterior - 1), np.nan)
+        return pd.DataFrame({
+            "linea": nombres, "actual": actual, "anterior": anterior, "dias": dias, "delta_pct": delta,
+            "festivos": festivos_sem, "festivos_anterior": festivos_ant,
+        })
+
+    def detalle_semana(self, linea, anio, semana):
+        """Los 7 dias de la semana de `linea` frente a los mismos dias del año ISO anterior."""
+        e, y, w = self._pos[linea], self._anio(anio), semana - 1
+        if y > 0:
+            fecha_ant, valor_ant, festivo_ant = self.fechas[y - 1, w], self.valores[e, y - 1, w], self.festivo[y - 1, w]
+        else:
+            fecha_ant = np.full(7, np.datetime64("NaT"), dtype="datetime64[D]")
+            valor_ant, festivo_ant = np.full(7, np.nan), np.zeros(7, dtype=bool)
+        return pd.DataFrame({
+            "dia": np.arange(7),
+            "fecha": pd.to_datetime(self.fechas[y, w]),
+            "afluencia": self.valores[e, y, w],
+            "festivo": self.festivo[y, w],
+            "fecha_anterior": pd.to_datetime(fecha_ant),
+            "afluencia_anterior": valor_ant,
+            "festivo_anterior": festivo_ant,
+        })
+
+    def comparar_mes(self, anio, mes, lineas=None):
+        """Promedio diario del mes contra el mes anterior (MoM) y el mismo mes del año pasado (YoY)."""
+        nombres, ids = self._ids(lineas)
+        i = (anio - 1970) * 12 + (mes - 1) - self.mes_inicio
+        with np.errstate(divide="ignore", invalid="ignore"):
+            promedio = self.total_mes[ids] / self.dias_mes[ids]
+        tomar = lambda j: promedio[:, j] if 0 <= j < promedio.shape[1] else np.full(len(ids), np.nan)
+        actual, mes_ant, anio_ant = tomar(i), tomar(i - 1), tomar(i - 12)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pd.DataFrame({
+                "linea": nombres,
+                "promedio": actual,
+                "promedio_mes_anterior": mes_ant,
+                "mom_pct": 100 * (actual / mes_ant - 1),
+                "promedio_anio_anterior": anio_ant,
+                "yoy_pct": 100 * (actual / anio_ant - 1),
+            })
+
+    def crecimiento(self, anio, lineas=None, excluir_festivos=False):
+        """Tabla (entidad x semana ISO) con el crecimiento YoY alineado de cada semana del año."""
+        nombres, ids = self._ids(lineas)
+        y = self._anio(anio)
+        columnas = pd.Index(np.arange(1, SEMANAS_ISO + 1), name="semana")
+        if y == 0:
+            return pd.DataFrame(np.nan, index=pd.Index(nombres, name="linea"), columns=columnas)
+        al = self._alineado[excluir_festivos]
+        act, ant = al["actual"][ids, y - 1], al["anterior"][ids, y - 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tabla = np.where((al["dias"][ids, y - 1] > 0) & (ant > 0), 100 * (act / ant - 1), np.nan)
+        return pd.DataFrame(tabla, index=pd.Index(nombres, name="linea"), columns=columnas)
+
+    def recuperacion(self, anio_base, lineas=None, suavizado=4):
+        """Curvas indexadas: total de cada semana completa / misma semana ISO del año base x 100.
+
+        Devuelve formato largo (fecha = lunes de la semana, linea, indice) con media movil de
+        `suavizado` semanas.
+        """
+        nombres, ids = self._ids(lineas)
+        b = self._anio(anio_base)
+        completas = (~np.isnan(self.valores[ids])).all(axis=-1)
+        semanal = np.where(completas, np.nan_to_num(self.valores[ids]).sum(axis=-1), np.nan)  # (e, año, semana)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            indice = 100 * semanal / semanal[:, b:b + 1]
+
+        # Año x semana en orden cronologico; se descartan las semanas que no existen
+        valida = ~np.isnat(self.lunes).ravel()
+        fechas = self.lunes.ravel()[valida]
+        serie = indice.reshape(len(ids), -1)[:, valida]
+        orden = np.argsort(fechas)
+        fechas, serie = fechas[orden], serie[:, orden]
+        if suavizado > 1:
+            serie = pd.DataFrame(serie.T).rolling(suavizado, min_periods=1).mean().to_numpy().T
+        return pd.DataFrame({
+            "fecha": pd.to_datetime(np.tile(fechas, len(ids))),
+            "linea": np.repeat(nombres, len(fechas)),
+            "indice": serie.ravel(),
+        }).dropna(subset=["indice"])
+
+
+@cache_medido(recurso=True)
+def comparativo_por_version(version):
+    cubo = cubo_por_version(version)
+    return ComparativoAnual(cubo.serie_por_linea(), cubo.lineas)
+
+
+def cargar_comparativo():
+    return comparativo_por_version(version_datos())
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from utils import cargar_datos, version_datos
+from motor.perfilado import cache_medido
+from motor.sql import USAR_SQL, base_por_version
+
+# --- INDICE POR (LINEA, FECHA) ---
+# Las filas se ordenan una sola vez por (linea_id, fecha) y se guardan los offsets
+# donde empieza cada linea. Filtrar por lineas y rango de fechas se reduce a una
+# busqueda binaria dentro de cada bloque y un slice, sin mascaras sobre todo el frame.
+
+class IndiceAfluencia:
+    def __init__(self, df):
+        ids, dias = df["linea_id"].to_numpy(), df["fecha"].to_numpy()
+        if len(df) < 2 or bool(np.all((ids[1:] > ids[:-1]) | ((ids[1:] == ids[:-1]) & (dias[1:] >= dias[:-1])))):
+            # El dataset compartido ya viene ordenado: se usa tal cual, sin copiarlo
+            self.df = df.reset_index(drop=True) if not isinstance(df.index, pd.RangeIndex) else df
+        else:
+            orden = np.lexsort((dias, ids))
+            self.df = df.iloc[orden].reset_index(drop=True)
+        self.lineas = list(self.df["linea"].cat.categories)
+        self._pos = {l: i for i, l in enumerate(self.lineas)}
+
+        ids = self.df["linea_id"].to_numpy()
+        self.offsets = np.searchsorted(ids, np.arange(len(self.lineas) + 1))
+        self.fechas = self.df["fecha"].to_numpy().astype("datetime64[D]")
+
+    def rango_fechas(self):
+        if self.df.empty: return None, None
+        return self.fechas.min().item(), self.fechas.max().item()
+
+    def _limites(self, i, ini, fin):
+        a, b = self.offsets[i], self.offsets[i + 1]
+        bloque = self.fechas[a:b]
+        lo = a + (np.searchsorted(bloque, ini, side="left") if ini is not None else 0)
+        hi = a + (np.searchsorted(bloque, fin, side="right") if fin is not None else b - a)
+        return lo, hi
+
+    def tramos(self, lineas=None, inicio=None, fin=None):
+        ids = range(len(self.lineas)) if lineas is None else [self._pos[l] for l in lineas if l in self._pos]
+        ini = np.datetime64(inicio, "D") if inicio is not None else None
+        end = np.datetime64(fin, "D") if fin is not None else None
+        limites = [self._limites(i, ini, end) for i in sorted(ids)]
+        return [(lo, hi) for lo, hi in limites if hi > lo]
+
+    def query(self, lineas=None, inicio=None, fin=None):
+        """Filas de `lineas` entre `inicio` y `fin` (inclusive). None = sin filtro."""
+        tramos = self.tramos(lineas, inicio, fin)
+        if not tramos:
+            return self.df.iloc[0:0]
+        if len(tramos) == 1:
+            lo, hi = tramos[0]
+            return self.df.iloc[lo:hi]
+        return self.df.iloc[np.concatenate([np.arange(lo, hi) for lo, hi in tramos])]
+
+
+@cache_medido(recurso=True)
+def indice_por_version(version):
+    if USAR_SQL:
+        # Backend embebido: `query` se resuelve con el indice (linea_id, dia) de la base
+        return base_por_version(version)
+    return IndiceAfluencia(cargar_datos())
+
+
+def cargar_indice():
+    # cache_resource: el indice se comparte entre sesiones sin copiarse en cada rerun
+    return indice_por_version(version_datos())
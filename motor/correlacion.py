@@ -0,0 +1,273 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.preprocessing import StandardScaler
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from motor.cubo import cubo_por_version
+from motor.estadisticas import dia_semana
+from motor.perfilado import cache_medido
+
+# --- CALCULOS DE LA VISTA DE CORRELACION ---
+# Las funciones puras reciben el cubo o arreglos (sin Streamlit, para el benchmark);
+# las envolturas `calcular_*` / `barrido_k` dependen solo de la version del dataset,
+# asi que Streamlit las reutiliza mientras no cambie el CSV.
+
+K_MIN, K_MAX = 2, 6
+FEATURES_COLS = ["promedio_diario", "desviacion_estandar", "total_acumulado", "pico_maximo"]
+
+
+@cache_medido()
+def calcular_pivot(version):
+    # Filas=Fechas, Columnas=Lineas
+    return cubo_por_version(version).matriz_lineas()
+
+
+def regresion_pares(df_ancho):
+    """Pendiente, intercepto, R y R² de la regresion simple para todos los pares de columnas.
+
+    Forma cerrada desde sumas cruzadas (productos de matrices), con observaciones
+    completas por par como `DataFrame.corr`. `pendiente.loc[x, y]` es la pendiente de
+    y sobre x. Devuelve un diccionario de DataFrames (L x L).
+    """
+    X = df_ancho.to_numpy(dtype=np.float64)
+    presente = ~np.isnan(X)
+    M = presente.astype(np.float64)
+    # Centrar por la media de cada columna no cambia la covarianza y evita perder precision
+    X0 = np.where(presente, X - np.nanmean(X, axis=0), 0.0)
+
+    n = M.T @ M                      # dias con ambas series
+    sx = X0.T @ M                    # suma de x (fila) donde y (columna) tiene dato
+    sxx = (X0 * X0).T @ M
+    sxy = X0.T @ X0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media_x, media_y = sx / n, sx.T / n
+        cov = sxy / n - media_x * media_y
+        var_x = sxx / n - media_x ** 2
+        var_y = var_x.T
+        pendiente = cov / var_x
+        r = np.clip(cov / np.sqrt(var_x * var_y), -1, 1)
+    # Las medias se calcularon sobre datos centrados: se regresa a la escala original
+    centro = np.nanmean(X, axis=0)
+    intercepto = (media_y + centro[None, :]) - pendiente * (media_x + centro[:, None])
+
+    cols = df_ancho.columns
+    como_df = lambda a: pd.DataFrame(a, index=cols, columns=cols)
+    return {
+        "pendiente": como_df(pendiente),
+        "intercepto": como_df(intercepto),
+        "r": como_df(r),
+        "r2": como_df(r ** 2),
+        "n": como_df(n.astype(np.int64)),
+    }
+
+
+@cache_medido()
+def calcular_regresiones(version):
+    return regresion_pares(calcular_pivot(version))
+
+
+@cache_medido()
+def calcular_correlacion(version):
+    # Mismo Pearson que `corr()`, tomado de la matriz de regresiones ya calculada
+    return calcular_regresiones(version)["r"]
+
+
+# --- CORRELACION MOVIL ---
+VENTANA_MOVIL = 90
+
+
+def correlacion_movil(df_ancho, ventana=VENTANA_MOVIL, paso=1):
+    """Matrices de Pearson sobre ventanas deslizantes de `ventana` filas (dias con datos).
+
+    Mantiene sumas, sumas de cuadrados y productos cruzados de la ventana: cada dia que
+    entra y sale actualiza la matriz completa en O(lineas²) sin recorrer la ventana.
+    Devuelve (fechas de cierre de cada ventana, arreglo (n_ventanas, L, L)) tomando una
+    ventana de cada `paso`.
+    """
+    X = df_ancho.to_numpy(dtype=np.float64)
+    D, L = X.shape
+    if D < ventana:
+        return df_ancho.index[:0], np.empty((0, L, L), dtype=np.float32)
+    # Centrado global: las sumas moviles quedan en magnitudes pequeñas y no pierden precision
+    X = X - X.mean(axis=0)
+
+    suma = X[:ventana].sum(axis=0)
+    cruzados = X[:ventana].T @ X[:ventana]
+    salidas = range(ventana - 1, D, paso)
+    matrices = np.empty((len(salidas), L, L), dtype=np.float32)
+
+    j = 0
+    for fin in range(ventana - 1, D):
+        if fin >= ventana:
+            entra, sale = X[fin], X[fin - ventana]
+            suma += entra - sale
+            cruzados += np.outer(entra, entra) - np.outer(sale, sale)
+        if (fin - ventana + 1) % paso == 0:
+            media = suma / ventana
+            cov = cruzados / ventana - np.outer(media, media)
+            desv = np.sqrt(np.maximum(np.diag(cov), 0))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                matrices[j] = np.clip(cov / np.outer(desv, desv), -1, 1)
+            j += 1
+    return df_ancho.index[list(salidas)], matrices
+
+
+@cache_medido(recurso=True)
+def calcular_correlacion_movil(version, ventana=VENTANA_MOVIL, paso=1):
+    # cache_resource: el arreglo (D, L, L) se comparte sin volver a deserializarse en cada
+    # rerun del fragmento; es de solo lectura
+    fechas, matrices = correlacion_movil(calcular_pivot(version), ventana, paso)
+    matrices.flags.writeable = False
+    return {"fechas": fechas, "lineas": list(calcular_pivot(version).columns), "matrices": matrices}
+
+
+def caracteristicas(cubo):
+    """Tabla de caracteristicas por linea, su version escalada y la proyeccion PCA (no depende de K)."""
+    df_features = cubo.estadisticas_por_linea().fillna(0)
+
+    # Escalado de datos (Necesario para PCA y K-Means)
+    X_scaled = StandardScaler().fit_transform(df_features[FEATURES_COLS])
+
+    # Reduccion de dimensiones (PCA) para visualizacion
+    pca = PCA(n_components=2)
+    components = pca.fit_transform(X_scaled)
+    df_features["PC1"] = components[:, 0]
+    df_features["PC2"] = components[:, 1]
+
+    var_explicada = pca.explained_variance_ratio_.sum() * 100
+    return df_features, X_scaled, var_explicada
+
+
+@cache_medido()
+def calcular_caracteristicas(version):
+    return caracteristicas(cubo_por_version(version))
+
+
+def _ajustar_k(X_scaled, k):
+    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
+    clusters = kmeans.fit_predict(X_scaled)
+    return {
+        "clusters": clusters,
+        "centroides": kmeans.cluster_centers_,
+        "inercia": kmeans.inertia_,
+        "silhouette": silhouette_score(X_scaled, clusters),
+    }
+
+
+def ajustar_barrido(X_scaled, k_min=K_MIN, k_max=K_MAX):
+    """Ajusta K-Means para cada k del rango en paralelo; el slider solo consulta el diccionario."""
+    # silhouette necesita 2 <= k <= n_muestras - 1
+    ks = [k for k in range(k_min, k_max + 1) if k < len(X_scaled)]
+    # KMeans libera el GIL en su nucleo compilado, por eso basta un pool de hilos
+    with ThreadPoolExecutor(max_workers=len(ks) or 1) as pool:
+        resultados = pool.map(lambda k: _ajustar_k(X_scaled, k), ks)
+    return dict(zip(ks, resultados))
+
+
+@cache_medido()
+def barrido_k(version, k_min=K_MIN, k_max=K_MAX):
+    _, X_scaled, _ = calcular_caracteristicas(version)
+    return ajustar_barrido(X_scaled, k_min, k_max)
+
+
+def curva_k(barrido):
+    return pd.DataFrame({
+        "k": list(barrido),
+        "inercia": [r["inercia"] for r in barrido.values()],
+        "silhouette": [r["silhouette"] for r in barrido.values()],
+    })
+
+
+# --- SEGMENTACION POR PERFIL (FORMA) ---
+# Cada entidad (hoy lineas; despues estaciones o rutas) se describe con su perfil promedio
+# dia de la semana x mes, dividido entre su propio promedio: dos lineas con el mismo patron
+# y distinto volumen quedan juntas. PCA incremental y MiniBatch K-Means reciben las entidades
+# por lotes con `partial_fit`, asi que la memoria no depende del numero de entidades.
+
+CELDAS_PERFIL = 7 * 12
+COMPONENTES_PERFIL = 8
+ENTIDADES_POR_LOTE = 1024
+EPOCAS_KMEANS = 5
+MUESTRA_SILHOUETTE = 2000
+
+
+def perfiles(df_largo, entidad="linea", valor="afluencia"):
+    """Tabla (entidades x 84) con el perfil dia de la semana x mes relativo al promedio de cada entidad.
+
+    Un solo bincount sobre (entidad, mes, dia de la semana) y un reshape; las celdas sin datos
+    quedan en 1 (el nivel promedio de la entidad).
+    """
+    codigos = pd.Categorical(df_largo[entidad])
+    fechas = df_largo["fecha"].to_numpy()
+    celda = (fechas.astype("datetime64[M]").astype(np.int64) % 12) * 7 + dia_semana(fechas)
+    idx = codigos.codes.astype(np.int64) * CELDAS_PERFIL + celda
+    n = len(codigos.categories) * CELDAS_PERFIL
+    suma = np.bincount(idx, weights=df_largo[valor].to_numpy(dtype=np.float64), minlength=n)
+    cuenta = np.bincount(idx, minlength=n)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        P = (suma / cuenta).reshape(-1, CELDAS_PERFIL)
+        P = P / np.nanmean(P, axis=1, keepdims=True)
+    P = np.where(np.isfinite(P), P, 1.0)
+    columnas = pd.MultiIndex.from_product([range(1, 13), range(7)], names=["mes", "dia_semana"])
+    return pd.DataFrame(P, index=pd.Index(codigos.categories, name=entidad), columns=columnas)
+
+
+def lotes(n, tamano=ENTIDADES_POR_LOTE, minimo=1):
+    """Rebanadas de `tamano` filas; el residuo menor que `minimo` se une al lote anterior."""
+    cortes = list(range(0, n, tamano)) + [n]
+    if len(cortes) > 2 and cortes[-1] - cortes[-2] < minimo:
+        cortes.pop(-2)
+    return [slice(a, b) for a, b in zip(cortes[:-1], cortes[1:])]
+
+
+def proyectar_perfiles(P, n_componentes=COMPONENTES_PERFIL, tamano_lote=ENTIDADES_POR_LOTE):
+    """Componentes principales de los perfiles con PCA incremental (lote por lote)."""
+    n_componentes = min(n_componentes, P.shape[0], P.shape[1])
+    ipca = IncrementalPCA(n_components=n_componentes)
+    partes = lotes(len(P), max(tamano_lote, n_componentes), minimo=n_componentes)
+    for lote in partes:
+        ipca.partial_fit(P[lote])
+    Z = np.vstack([ipca.transform(P[lote]) for lote in partes])
+    return Z, ipca.explained_variance_ratio_
+
+
+def _ajustar_k_lotes(Z, k, tamano_lote=ENTIDADES_POR_LOTE, epocas=EPOCAS_KMEANS):
+    rng = np.random.default_rng(42)
+    kmeans = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3, batch_size=tamano_lote)
+    for _ in range(epocas):
+        orden = rng.permutation(len(Z))
+        for lote in lotes(len(Z), max(tamano_lote, k), minimo=k):
+            kmeans.partial_fit(Z[orden[lote]])
+    clusters = kmeans.predict(Z)
+    # Silhouette es cuadratico en el numero de entidades: con muchas se estima sobre una muestra
+    n_muestra = min(len(Z), MUESTRA_SILHOUETTE)
+    score = silhouette_score(Z, clusters, sample_size=n_muestra, random_state=42) if len(set(clusters)) > 1 else np.nan
+    return {
+        "clusters": clusters,
+        "centroides": kmeans.cluster_centers_,
+        "inercia": float(((Z - kmeans.cluster_centers_[clusters]) ** 2).sum()),
+        "silhouette": score,
+    }
+
+
+def ajustar_barrido_perfiles(Z, k_min=K_MIN, k_max=K_MAX):
+    ks = [k for k in range(k_min, k_max + 1) if k < len(Z)]
+    with ThreadPoolExecutor(max_workers=len(ks) or 1) as pool:
+        resultados = pool.map(lambda k: _ajustar_k_lotes(Z, k), ks)
+    return dict(zip(ks, resultados))
+
+
+@cache_medido()
+def calcular_perfiles(version):
+    df_perfiles = perfiles(cubo_por_version(version).serie_por_linea())
+    Z, var = proyectar_perfiles(df_perfiles.to_numpy())
+    return df_perfiles, Z, var[:2].sum() * 100
+
+
+@cache_medido()
+def barrido_perfiles(version, k_min=K_MIN, k_max=K_MAX):
+    _, Z, _ = calcular_perfiles(version)
+    return ajustar_barrido_perfiles(Z, k_min, k_max)
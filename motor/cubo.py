@@ -0,0 +1,273 @@
+import numpy as np
+import pandas as pd
+from utils import leer_particion, lineas_particiones, manifiesto_actual, version_datos
+from motor.perfilado import cache_medido
+from motor.sql import USAR_SQL, base_por_version
+
+# --- CUBO DIARIO FECHA x LINEA x TIPO_PAGO ---
+# Se materializa una sola vez: valores[d, l, p] = afluencia del dia d, linea l y tipo de pago p,
+# y filas[d, l, p] = numero de registros originales en esa celda (0 = sin dato).
+# Todos los rollups de las vistas se responden sumando rebanadas de estos arreglos.
+
+class CuboAfluencia:
+    def __init__(self, df, inicio=None, lineas=None, tipos_pago=None):
+        # `lineas`/`tipos_pago` fijan el orden de los catalogos; lo que no este en ellos se agrega al final
+        self.lineas = list(df["linea"].cat.categories if lineas is None else lineas)
+        self.tipos_pago = list(df["tipo_pago"].astype("category").cat.categories if tipos_pago is None else tipos_pago)
+        # `inicio` fija el primer dia del eje (p. ej. el inicio de un rango que puede venir vacio)
+        if inicio is None:
+            inicio = df["fecha"].min() if len(df) else "1970-01-01"
+        self.inicio = np.datetime64(inicio, "D")
+        self.n_dias = 0
+        self._valores = np.zeros((0, len(self.lineas), len(self.tipos_pago)), dtype=np.int64)
+        self._filas = np.zeros(self._valores.shape, dtype=np.int32)
+        self.agregar(df)
+
+    # --- CONSTRUCCION E INCREMENTOS ---
+    @property
+    def valores(self):
+        return self._valores[:self.n_dias]
+
+    @property
+    def filas(self):
+        return self._filas[:self.n_dias]
+
+    @property
+    def fechas(self):
+        return self.inicio + np.arange(self.n_dias).astype("timedelta64[D]")
+
+    def _codigos(self, serie, catalogo):
+        # Agrega categorias nuevas al catalogo y remapea los codigos por categoria (no por fila)
+        cat = serie.astype("category").cat
+        nombres = [str(c) for c in cat.categories]
+        catalogo.extend(n for n in dict.fromkeys(nombres) if n not in catalogo)
+        remap = np.array([catalogo.index(n) for n in nombres], dtype=np.int64)
+        return remap[cat.codes.to_numpy()]
+
+    def _reservar(self, n_dias, n_lineas, n_pagos):
+        # El eje de dias crece con capacidad doble para que agregar un dia sea O(1) amortizado
+        cap, L, P = self._valores.shape
+        if n_dias <= cap and n_lineas <= L and n_pagos <= P:
+            return
+        nueva_cap = max(n_dias, cap * 2 if n_dias > cap else cap)
+        shape = (nueva_cap, max(n_lineas, L), max(n_pagos, P))
+        for nombre in ["_valores", "_filas"]:
+            viejo = getattr(self, nombre)
+            nuevo = np.zeros(shape, dtype=viejo.dtype)
+            nuevo[:self.n_dias, :L, :P] = viejo[:self.n_dias]
+            setattr(self, nombre, nuevo)
+
+    def agregar(self, df):
+        """Suma las filas de `df` al cubo. Si traen dias nuevos, solo se extiende el eje de dias."""
+        if df.empty:
+            return
+        dias = (df["fecha"].to_numpy().astype("datetime64[D]") - self.inicio).astype(np.int64)
+        if dias.min() < 0:
+            raise ValueError("El cubo solo admite datos posteriores a su fecha inicial")
+        l = self._codigos(df["linea"], self.lineas)
+        p = self._codigos(df["tipo_pago"], self.tipos_pago)
+
+        n_dias = max(self.n_dias, int(dias.max()) + 1)
+        self._reservar(n_dias, len(self.lineas), len(self.tipos_pago))
+        self.n_dias = n_dias
+
+        _, L, P = self._valores.shape
+        plano = (dias * L + l) * P + p
+        base = int(dias.min()) * L * P
+        tam = n_dias * L * P - base
+        suma = np.bincount(plano - base, weights=df["afluencia"].to_numpy(), minlength=tam)
+        cuenta = np.bincount(plano - base, minlength=tam)
+        self._valores.reshape(-1)[base:base + tam] += np.rint(suma).astype(np.int64)
+        self._filas.reshape(-1)[base:base + tam] += cuenta.astype(np.int32)
+
+    def copia(self):
+        """Copia independiente: el cubo cacheado puede seguir en uso por otras sesiones."""
+        otro = CuboAfluencia.__new__(CuboAfluencia)
+        otro.__dict__.update(self.__dict__)
+        otro.lineas, otro.tipos_pago = list(self.lineas), list(self.tipos_pago)
+        otro._valores, otro._filas = self._valores.copy(), self._filas.copy()
+        return otro
+
+    # --- SELECCION ---
+    def _rango(self, inicio=None, fin=None):
+        a = 0 if inicio is None else int((np.datetime64(inicio, "D") - self.inicio).astype(int))
+        b = self.n_dias if fin is None else int((np.datetime64(fin, "D") - self.inicio).astype(int)) + 1
+        return slice(max(a, 0), min(max(b, 0), self.n_dias))
+
+    def _ids(self, lineas=None):
+        if lineas is None:
+            return np.arange(len(self.lineas))
+        return np.array([self.lineas.index(l) for l in lineas if l in self.lineas], dtype=np.int64)
+
+    def rebanada(self, lineas=None, inicio=None, fin=None):
+        r, ids = self._rango(inicio, fin), self._ids(lineas)
+        return self.valores[r][:, ids], self.filas[r][:, ids], self.fechas[r], [self.lineas[i] for i in ids]
+
+    # --- ROLLUPS ---
+    def rango_fechas(self):
+        if self.n_dias == 0: return None, None
+        return self.inicio.item(), self.fechas[-1].item()
+
+    def dias_con_datos(self, lineas=None, inicio=None, fin=None):
+        _, filas, _, _ = self.rebanada(lineas, inicio, fin)
+        return int((filas.sum(axis=(1, 2)) > 0).sum())
+
+    def serie_por_linea(self, lineas=None, inicio=None, fin=None):
+        """Equivalente a groupby(["fecha", "linea"]).sum() (formato largo)."""
+        val, filas, fechas, nombres = self.rebanada(lineas, inicio, fin)
+        tot, hay = val.sum(axis=2), filas.sum(axis=2) > 0
+        d, l = np.nonzero(hay)
+        return pd.DataFrame({
+            "fecha": pd.to_datetime(fechas[d]),
+            "linea": pd.Categorical.from_codes(l, categories=nombres),
+            "afluencia": tot[d, l],
+        })
+
+    def serie_por_linea_pago(self, lineas=None, inicio=None, fin=None):
+        """Equivalente a groupby(["fecha", "linea", "tipo_pago"]).sum() (formato largo)."""
+        val, filas, fechas, nombres = self.rebanada(lineas, inicio, fin)
+        d, l, p = np.nonzero(filas > 0)
+        return pd.DataFrame({
+            "fecha": pd.to_datetime(fechas[d]),
+            "linea": pd.Categorical.from_codes(l, categories=nombres),
+            "tipo_pago": pd.Categorical.from_codes(p, categories=self.tipos_pago),
+            "afluencia": val[d, l, p],
+        })
+
+    def serie_diaria(self, lineas=None, inicio=None, fin=None):
+        """Equivalente a groupby("fecha").sum() sobre las lineas seleccionadas."""
+        val, filas, fechas, _ = self.rebanada(lineas, inicio, fin)
+        hay = filas.sum(axis=(1, 2)) > 0
+        return pd.DataFrame({"fecha": pd.to_datetime(fechas[hay]), "afluencia": val.sum(axis=(1, 2))[hay]})
+
+    def matriz_lineas(self, lineas=None, inicio=None, fin=None):
+        """Equivalente a pivot_table(index="fecha", columns="linea", aggfunc="sum").fillna(0)."""
+        val, filas, fechas, nombres = self.rebanada(lineas, inicio, fin)
+        hay = filas.sum(axis=(1, 2)) > 0
+        con_datos = filas.sum(axis=(0, 2)) > 0
+        return pd.DataFrame(
+            val.sum(axis=2)[hay][:, con_datos],
+            index=pd.DatetimeIndex(pd.to_datetime(fechas[hay]), name="fecha"),
+            columns=pd.Index([n for n, ok in zip(nombres, con_datos) if ok], name="linea"),
+        )
+
+    def total_por_linea(self, lineas=None, inicio=None, fin=None):
+        val, filas, _, nombres = self.rebanada(lineas, inicio, fin)
+        hay = filas.sum(axis=(0, 2)) > 0
+        return pd.DataFrame({"linea": np.array(nombres)[hay], "afluencia": val.sum(axis=(0, 2))[hay]})
+
+    def total_por_pago(self, lineas=None, inicio=None, fin=None):
+        val, filas, _, _ = self.rebanada(lineas, inicio, fin)
+        hay = filas.sum(axis=(0, 1)) > 0
+        return pd.DataFrame({"tipo_pago": np.array(self.tipos_pago)[hay], "afluencia": val.sum(axis=(0, 1))[hay]})
+
+    def linea_por_pago(self, lineas=None, inicio=None, fin=None):
+        val, filas, _, nombres = self.rebanada(lineas, inicio, fin)
+        tot, hay = val.sum(axis=0), filas.sum(axis=0) > 0
+        l, p = np.nonzero(hay)
+        return pd.DataFrame({
+            "linea": np.array(nombres)[l],
+            "tipo_pago": np.array(self.tipos_pago)[p],
+            "afluencia": tot[l, p],
+        })
+
+    def estadisticas_por_linea(self, lineas=None, inicio=None, fin=None):
+        """Promedio, desviacion, total y pico por linea sobre las celdas diarias con dato."""
+        val, filas, _, nombres = self.rebanada(lineas, inicio, fin)
+        val = val.astype(np.float64)
+        hay = filas > 0
+        n = hay.sum(axis=(0, 2))
+        total = val.sum(axis=(0, 2))
+        media = np.divide(total, n, out=np.zeros_like(total), where=n > 0)
+        dev = np.where(hay, val - media[None, :, None], 0.0)
+        var = np.divide((dev ** 2).sum(axis=(0, 2)), n - 1, out=np.zeros_like(total), where=n > 1)
+        pico = np.where(hay, val, -np.inf).max(axis=(0, 2), initial=-np.inf)
+        ok = n > 0
+        return pd.DataFrame({
+            "linea": np.array(nombres)[ok],
+            "promedio_diario": media[ok],
+            "desviacion_estandar": np.sqrt(var[ok]),
+            "total_acumulado": total[ok],
+            "pico_maximo": pico[ok],
+        })
+
+
+# Ultimo cubo construido y, por particion, que filas contiene (hash, fechas, filas y una huella
+# de su contenido). Si la version nueva solo agrega particiones o filas al final de una
+# particion (el caso normal: un dia mas en el CSV del año en curso), se copia el cubo y se le
+# suman unicamente las filas nuevas
+_previo = {}
+
+
+def _contenido(info, df):
+    huella = pd.util.hash_pandas_object(df[["fecha", "linea", "tipo_pago", "afluencia"]], index=False).sum()
+    return {"hash": info["hash"], "inicio": info["inicio"], "fin": info["fin"], "filas": len(df), "huella": int(huella)}
+
+
+def _filas_por_leer(previo, manifiesto):
+    """{ruta: filas ya sumadas} de las particiones nuevas o extendidas; None si hay que reconstruir."""
+    cubo, contenidas = previo
+    if any(relpath not in manifiesto for relpath in contenidas):
+        return None  # una particion ya sumada desaparecio
+    plan = {}
+    for relpath, info in manifiesto.items():
+        antes = contenidas.get(relpath)
+        if antes is None:
+            if np.datetime64(info["inicio"], "D") < cubo.inicio:
+                return None  # el eje de dias solo crece hacia adelante
+            plan[relpath] = 0
+        elif antes["hash"] != info["hash"]:
+            # Misma particion con otro contenido: solo sirve si crecio hacia adelante
+            if info["inicio"] != antes["inicio"] or pd.Timestamp(info["fin"]) < pd.Timestamp(antes["fin"]):
+                return None
+            plan[relpath] = antes["filas"]
+    return plan
+
+
+def _extender(previo, manifiesto):
+    plan = _filas_por_leer(previo, manifiesto)
+    if plan is None:
+        return None
+    cubo, contenidas = previo[0].copia(), dict(previo[1])
+    for relpath, desde in plan.items():
+        df = leer_particion(relpath, manifiesto[relpath])
+        # Las filas ya sumadas deben ser un prefijo intacto del archivo actual
+        if desde and (len(df) < desde or _contenido(manifiesto[relpath], df.iloc[:desde])["huella"] != contenidas[relpath]["huella"]):
+            return None
+        cubo.agregar(df.iloc[desde:])
+        contenidas[relpath] = _contenido(manifiesto[relpath], df)
+    return cubo, contenidas
+
+
+def _construir(manifiesto):
+    # Particion por particion: nunca se arma la tabla completa de filas
+    cubo, contenidas = None, {}
+    for relpath, info in manifiesto.items():
+        df = leer_particion(relpath, info)
+        if cubo is None:
+            cubo = CuboAfluencia(
+                df,
+                inicio=min(i["inicio"] for i in manifiesto.values()),
+                lineas=lineas_particiones(manifiesto),
+                tipos_pago=sorted(set().union(*(i["tipos_pago"] for i in manifiesto.values()))),
+            )
+        else:
+            cubo.agregar(df)
+        contenidas[relpath] = _contenido(info, df)
+    return cubo, contenidas
+
+
+@cache_medido(recurso=True)
+def cubo_por_version(version):
+    if USAR_SQL:
+        # Backend embebido: los mismos rollups se responden con consultas al archivo
+        return base_por_version(version)
+    manifiesto = manifiesto_actual()
+    previo = _previo.get("cubo")
+    estado = (_extender(previo, manifiesto) if previo is not None else None) or _construir(manifiesto)
+    _previo["cubo"] = estado
+    return estado[0]
+
+
+def cargar_cubo():
+    return cubo_por_version(version_datos())
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import rfft, rfftfreq
+from motor.cubo import cubo_por_version
+from motor.perfilado import cache_medido
+
+# --- MOTOR ESPECTRAL ---
+# Todas las series (Sistema Total + cada linea) se acomodan en una matriz densa
+# dias x series y se transforman con una sola rfft a lo largo del eje temporal.
+
+SISTEMA = "Sistema Total"
+FREQ_MIN = 0.005   # descarta tendencias de muy baja frecuencia
+POTENCIA_MIN = 100  # descarta ruido de baja amplitud
+
+
+def matriz_series(cubo):
+    """Devuelve (fechas, nombres, Y) con Y de forma (dias, 1 + lineas), huecos rellenados hacia adelante."""
+    # Se arma desde el formato largo (dia, linea) para que sirva igual con el cubo o con el backend SQL
+    largo = cubo.serie_por_linea()
+    nombres = list(largo["linea"].cat.categories)
+    ini, fin = cubo.rango_fechas()
+    fechas = np.arange(np.datetime64(ini, "D"), np.datetime64(fin, "D") + 1) if ini is not None else np.array([], dtype="datetime64[D]")
+    d = (largo["fecha"].to_numpy().astype("datetime64[D]") - fechas[0]).astype(np.int64) if len(largo) else np.array([], dtype=np.int64)
+    l = largo["linea"].cat.codes.to_numpy()
+    por_linea = np.zeros((len(fechas), len(nombres)), dtype=np.float64)
+    hay_linea = np.zeros(por_linea.shape, dtype=bool)
+    por_linea[d, l] = largo["afluencia"].to_numpy()
+    hay_linea[d, l] = True
+    Y = np.column_stack([por_linea.sum(axis=1), por_linea])
+    hay = np.column_stack([hay_linea.any(axis=1), hay_linea])
+
+    # Forward-fill vectorizado: cada celda sin dato toma el ultimo indice con dato de su columna
+    idx = np.where(hay, np.arange(len(Y))[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    Y = Y[idx, np.arange(Y.shape[1])]
+    # Antes del primer dato de una serie (p. ej. una linea nueva) no hay que rellenar: va en cero
+    Y[~np.maximum.accumulate(hay, axis=0)] = 0.0
+    return pd.to_datetime(fechas), [SISTEMA] + nombres, Y
+
+
+def periodos(freqs):
+    # Periodo = 1 / frecuencia, con 0 para la componente de frecuencia cero
+    return np.divide(1.0, freqs, out=np.zeros_like(freqs), where=freqs > 0)
+
+
+def espectro(Y, paso=1.0):
+    """Amplitud espectral de cada columna de Y (una rfft batch sobre el eje 0)."""
+    n = Y.shape[0]
+    # Restar la media para eliminar el componente DC
+    Yc = Y - Y.mean(axis=0, keepdims=True)
+    F = rfft(Yc, axis=0)
+    # Solo la mitad positiva del espectro (sin Nyquist), como la FFT completa original
+    freqs = rfftfreq(n, paso)[:n // 2]
+    magnitud = 2.0 / n * np.abs(F[:n // 2])
+    return freqs, magnitud
+
+
+@cache_medido()
+def calcular_espectros(version):
+    fechas, nombres, Y = matriz_series(cubo_por_version(version))
+    freqs, magnitud = espectro(Y)
+    return {
+        "fechas": fechas, "nombres": nombres, "Y": Y,
+        "freqs": freqs, "periodos": periodos(freqs), "magnitud": magnitud,
+    }
+
+
+def espectro_serie(espectros, nombre):
+    j = espectros["nombres"].index(nombre)
+    df_fft = pd.DataFrame({
+        "Frecuencia": espectros["freqs"],
+        "Potencia": espectros["magnitud"][:, j],
+        "Periodo (Dias)": espectros["periodos"],
+    })
+    # Filtramos ruido (Frecuencias muy bajas o periodos infinitos)
+    return df_fft[(df_fft["Frecuencia"] > FREQ_MIN) & (df_fft["Potencia"] > POTENCIA_MIN)]
+
+
+# --- ESPECTROGRAMA (STFT) ---
+def espectrograma(y, ventana, paso):
+    """STFT de una serie diaria: ventanas deslizantes como vista con strides, una rfft batch."""
+    y = np.asarray(y, dtype=np.float64)
+    ventana = int(min(ventana, len(y)))
+    marcos = sliding_window_view(y, ventana)[::paso]  # (n_ventanas, ventana), sin copiar
+    # Cada ventana se centra en su media y se suaviza con Hann para reducir fuga espectral
+    hann = np.hanning(ventana)
+    marcos = (marcos - marcos.mean(axis=1, keepdims=True)) * hann
+    F = rfft(marcos, axis=1)
+    freqs = rfftfreq(ventana, 1.0)
+    magnitud = 2.0 / hann.sum() * np.abs(F)
+    centros = np.arange(marcos.shape[0]) * paso + ventana // 2
+    return centros, freqs, magnitud
+
+
+@cache_medido()
+def calcular_espectrograma(version, nombre, ventana, paso):
+    espectros = calcular_espectros(version)
+    j = espectros["nombres"].index(nombre)
+    centros, freqs, magnitud = espectrograma(espectros["Y"][:, j], ventana, paso)
+    return {
+        "fechas": espectros["fechas"][centros],
+        "freqs": freqs, "periodos": periodos(freqs), "magnitud": magnitud,
+    }
+
+
+def ciclos_dominantes(espectros, top=3):
+    """Los `top` ciclos de mayor amplitud de cada serie, calculados para todas a la vez."""
+    freqs, mag = espectros["freqs"], espectros["magnitud"]
+    valido = (freqs > FREQ_MIN)[:, None] & (mag > POTENCIA_MIN)
+    mag_valida = np.where(valido, mag, -np.inf)
+    top = min(top, len(freqs))
+    orden = np.argsort(-mag_valida, axis=0)[:top]  # (top, series)
+    amp = np.take_along_axis(mag_valida, orden, axis=0)
+
+    rango, serie = np.nonzero(np.isfinite(amp))
+    return pd.DataFrame({
+        "Serie": np.array(espectros["nombres"])[serie],
+        "Rango": rango + 1,
+        "Periodo (Dias)": espectros["periodos"][orden[rango, serie]],
+        "Potencia": amp[rango, serie],
+    }).sort_values(["Serie", "Rango"], ignore_index=True)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# --- ESTADISTICAS DE DISTRIBUCION (LADO SERVIDOR) ---
+# En lugar de mandar cada fila al navegador para que Plotly calcule bins y cuartiles,
+# se calculan aqui y se grafican solo los resumenes (bins, cuartiles, bigotes, atipicos).
+
+DIAS_SEMANA = ["Lunes", "Martes", "Miercoles", "Jueves", "Viernes", "Sabado", "Domingo"]
+
+
+def dia_semana(fechas):
+    # 1970-01-01 fue jueves (3 con lunes=0)
+    dias = np.asarray(fechas).astype("datetime64[D]").astype(np.int64)
+    return (dias + 3) % 7
+
+
+def histograma(valores, nbins=40):
+    conteos, bordes = np.histogram(np.asarray(valores, dtype=np.float64), bins=nbins)
+    return pd.DataFrame({
+        "inicio": bordes[:-1],
+        "fin": bordes[1:],
+        "centro": (bordes[:-1] + bordes[1:]) / 2,
+        "conteo": conteos,
+    })
+
+
+def _cuantil(ordenados, offsets, n, q):
+    # Cuantil con interpolacion lineal (igual que np.percentile) para todos los grupos a la vez
+    pos = offsets + q * (n - 1)
+    bajo = np.floor(pos).astype(np.int64)
+    alto = np.minimum(bajo + 1, offsets + n - 1)
+    frac = pos - bajo
+    return ordenados[bajo] * (1 - frac) + ordenados[alto] * frac
+
+
+def resumen_caja(valores, grupos=None, n_grupos=None):
+    """Cuartiles, bigotes (1.5 IQR), media y atipicos por grupo, en una sola pasada ordenada.
+
+    Devuelve (resumen, atipicos): un DataFrame con una fila por grupo no vacio y otro
+    con las observaciones fuera de los bigotes (columnas grupo, valor).
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    grupos = np.zeros(len(valores), dtype=np.int64) if grupos is None else np.asarray(grupos, dtype=np.int64)
+    n_grupos = n_grupos or (int(grupos.max()) + 1 if len(grupos) else 0)
+
+    orden = np.lexsort((valores, grupos))
+    v, g = valores[orden], grupos[orden]
+    n_todos = np.bincount(g, minlength=n_grupos)
+    presentes = np.nonzero(n_todos)[0]
+    n = n_todos[presentes]
+    offsets = (np.cumsum(n_todos) - n_todos)[presentes]
+
+    q1 = _cuantil(v, offsets, n, 0.25)
+    mediana = _cuantil(v, offsets, n, 0.5)
+    q3 = _cuantil(v, offsets, n, 0.75)
+    iqr = q3 - q1
+    lim_inf, lim_sup = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+    # Los bigotes llegan al dato mas extremo dentro de los limites de su grupo
+    pos_grupo = np.searchsorted(presentes, g)
+    dentro = (v >= lim_inf[pos_grupo]) & (v <= lim_sup[pos_grupo])
+    bigote_inf = np.minimum.reduceat(np.where(dentro, v, np.inf), offsets)
+    bigote_sup = np.maximum.reduceat(np.where(dentro, v, -np.inf), offsets)
+    media = np.add.reduceat(v, offsets) / n
+
+    resumen = pd.DataFrame({
+        "grupo": presentes, "n": n, "q1": q1, "mediana": mediana, "q3": q3,
+        "bigote_inf": bigote_inf, "bigote_sup": bigote_sup, "media": media,
+    })
+    atipicos = pd.DataFrame({"grupo": g[~dentro], "valor": v[~dentro]})
+    return resumen, atipicos
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from motor.cubo import cubo_por_version
+from motor.perfilado import cache_medido
+from utils import version_datos
+
+# --- TABLA DE KPIS PRECALCULADA ---
+# Total, dias con datos y pico diario por linea para cualquier rango de fechas sin tocar
+# las filas: sumas acumuladas para totales y dias, y una tabla dispersa (sparse table) de
+# maximos por potencias de dos para el pico. Cada consulta cuesta O(1) por linea.
+
+
+class TablaKPI:
+    def __init__(self, df_largo, lineas=None):
+        """`df_largo`: fecha, linea, afluencia (una fila por dia y linea con datos)."""
+        codigos = pd.Categorical(df_largo["linea"], categories=lineas)
+        self.lineas = list(codigos.categories)
+        self._pos = {l: i for i, l in enumerate(self.lineas)}
+        dias = df_largo["fecha"].to_numpy().astype("datetime64[D]")
+        self.inicio = dias.min() if len(dias) else np.datetime64("1970-01-01")
+        n_dias = int((dias.max() - self.inicio).astype(np.int64)) + 1 if len(dias) else 0
+
+        fila = (dias - self.inicio).astype(np.int64)
+        diario = np.zeros((n_dias, len(self.lineas) + 1))
+        hay = np.zeros(diario.shape, dtype=bool)
+        diario[fila, codigos.codes] = df_largo["afluencia"].to_numpy(dtype=np.float64)
+        hay[fila, codigos.codes] = True
+        # Ultima columna: el sistema completo (todas las lineas)
+        diario[:, -1] = diario[:, :-1].sum(axis=1)
+        hay[:, -1] = hay[:, :-1].any(axis=1)
+
+        ceros = np.zeros((1, diario.shape[1]))
+        self._total = np.vstack([ceros, np.cumsum(diario, axis=0)])
+        self._dias = np.vstack([ceros.astype(np.int64), np.cumsum(hay, axis=0)])
+        self._hay = hay[:, :-1]  # presencia por dia y linea, para los dias de un subconjunto
+        self._maximos = [np.where(hay, diario, -np.inf)]
+        paso = 1
+        while 2 * paso <= n_dias:
+            previo = self._maximos[-1]
+            self._maximos.append(np.maximum(previo[:-paso], previo[paso:]))
+            paso *= 2
+
+    def _rango(self, inicio=None, fin=None):
+        n = len(self._total) - 1
+        a = 0 if inicio is None else int((np.datetime64(inicio, "D") - self.inicio).astype(np.int64))
+        b = n if fin is None else int((np.datetime64(fin, "D") - self.inicio).astype(np.int64)) + 1
+        a, b = min(max(a, 0), n), min(max(b, 0), n)
+        return a, max(a, b)
+
+    def _consultar(self, cols, inicio, fin):
+        a, b = self._rango(inicio, fin)
+        total = self._total[b, cols] - self._total[a, cols]
+        dias = self._dias[b, cols] - self._dias[a, cols]
+        if b > a:
+            j = (b - a).bit_length() - 1
+            nivel = self._maximos[j]
+            maximo = np.maximum(nivel[a, cols], nivel[b - (1 << j), cols])
+        else:
+            maximo = np.full(len(cols), -np.inf)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            promedio = np.where(dias > 0, total / dias, 0.0)
+        return total, dias, promedio, np.where(np.isfinite(maximo), maximo, 0.0)
+
+    def por_linea(self, lineas=None, inicio=None, fin=None):
+        """Total, dias con datos, promedio diario y pico diario de cada linea en el rango."""
+        nombres = self.lineas if lineas is None else [l for l in lineas if l in self._pos]
+        cols = np.array([self._pos[l] for l in nombres], dtype=np.int64)
+        total, dias, promedio, maximo = self._consultar(cols, inicio, fin)
+        return pd.DataFrame({"linea": nombres, "total": total, "dias": dias, "promedio": promedio, "maximo": maximo})
+
+    def sistema(self, lineas=None, inicio=None, fin=None):
+        """KPIs del conjunto de lineas. Con todas las lineas es O(1); con un subconjunto el total
+        suma las acumuladas de cada linea, los dias (con dato de alguna linea elegida) salen de
+        la matriz booleana de presencia y no se calcula el pico."""
+        if lineas is None or set(self.lineas) <= set(lineas):
+            total, dias, promedio, maximo = (v[0] for v in self._consultar(np.array([-1]), inicio, fin))
+            return {"total": total, "dias": int(dias), "promedio": promedio, "maximo": maximo}
+
+        cols = np.array([self._pos[l] for l in lineas if l in self._pos], dtype=np.int64)
+        a, b = self._rango(inicio, fin)
+        total = float((self._total[b, cols] - self._total[a, cols]).sum())
+        dias = int(self._hay[a:b, cols].any(axis=1).sum())
+        return {"total": total, "dias": dias, "promedio": total / dias if dias else 0.0, "maximo": None}
+
+
+@cache_medido(recurso=True)
+def kpis_por_version(version):
+    cubo = cubo_por_version(version)
+    return TablaKPI(cubo.serie_por_linea(), cubo.lineas)
+
+
+def cargar_kpis():
+    return kpis_por_version(version_datos())
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+# --- SUBMUESTREO DE SERIES PARA GRAFICAS ---
+# Plotly manda cada punto al navegador. Para series largas se reduce cada traza a
+# un maximo de puntos (~1 por pixel de ancho) con Largest-Triangle-Three-Buckets,
+# que conserva picos y caidas. Si el rango filtrado ya cabe, se devuelve completo.
+# Cada vista pasa el ancho de su grafica: una en media columna necesita la mitad de puntos.
+
+ANCHO_PAGINA_PX = 1200  # ancho util aproximado del layout "wide"
+
+
+def max_puntos(ancho_px, puntos_por_px=1.0):
+    return max(3, int(ancho_px * puntos_por_px))
+
+
+def lttb(x, y, n_salida):
+    """Indices de los `n_salida` puntos elegidos por LTTB (incluye siempre el primero y el ultimo).
+
+    `y` puede ser 1D o 2D (n, series) con `x` compartido; en 2D se procesan todas las
+    series a la vez y se devuelve un arreglo (n_salida, series).
+    """
+    n = len(y)
+    if n_salida >= n or n_salida < 3:
+        idx = np.arange(n)
+        return idx if np.ndim(y) == 1 else np.repeat(idx[:, None], np.shape(y)[1], axis=1)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    Y = y[:, None] if y.ndim == 1 else y
+    cols = np.arange(Y.shape[1])
+    # Limites de los n_salida - 2 buckets intermedios
+    bordes = np.linspace(1, n - 1, n_salida - 1).astype(np.int64)
+    # Promedio de cada bucket (para el "tercer punto" del triangulo), con sumas acumuladas
+    cx = np.concatenate([[0], np.cumsum(x)])
+    cy = np.vstack([np.zeros((1, Y.shape[1])), np.cumsum(Y, axis=0)])
+    tam = np.maximum(bordes[1:] - bordes[:-1], 1)
+    prom_x = (cx[bordes[1:]] - cx[bordes[:-1]]) / tam
+    prom_y = (cy[bordes[1:]] - cy[bordes[:-1]]) / tam[:, None]
+    prom_x = np.append(prom_x[1:], x[-1])
+    prom_y = np.vstack([prom_y[1:], Y[-1:]])
+
+    elegidos = np.empty((n_salida, Y.shape[1]), dtype=np.int64)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    a = np.zeros(Y.shape[1], dtype=np.int64)
+    for i in range(n_salida - 2):
+        lo, hi = bordes[i], max(bordes[i + 1], bordes[i] + 1)
+        xa, ya = x[a], Y[a, cols]
+        # Area (x2) del triangulo entre el punto anterior, cada candidato y el promedio siguiente
+        area = np.abs(
+            (xa - prom_x[i]) * (Y[lo:hi] - ya) - (xa - x[lo:hi, None]) * (prom_y[i] - ya)
+        )
+        a = lo + np.argmax(area, axis=0)
+        elegidos[i + 1] = a
+    return elegidos[:, 0] if y.ndim == 1 else elegidos
+
+
+def _eje_numerico(xs):
+    xs = np.asarray(xs)
+    return xs.astype("datetime64[ns]").astype(np.int64) if np.issubdtype(xs.dtype, np.datetime64) else xs
+
+
+def reducir_serie(df, ancho_px, x="fecha", y="afluencia", n_max=None):
+    """Aplica LTTB a una traza de un DataFrame listo para graficar en `ancho_px` pixeles."""
+    n_max = n_max or max_puntos(ancho_px)
+    if len(df) <= n_max:
+        return df
+    return df.iloc[lttb(_eje_numerico(df[x].to_numpy()), df[y].to_numpy(), n_max)]
+
+
+def reducir_matriz(df_ancho, ancho_px, columna="linea", valor="afluencia", n_max=None):
+    """LTTB de todas las columnas de una tabla ancha (indice = fecha) en un solo barrido.
+
+    Devuelve el formato largo (fecha, columna, valor) que espera plotly express.
+    """
+    n_max = n_max or max_puntos(ancho_px)
+    idx = lttb(_eje_numerico(df_ancho.index.to_numpy()), df_ancho.to_numpy(), n_max)
+    # Recorrido por columnas: todos los puntos de la primera serie, luego la segunda, ...
+    filas = idx.ravel(order="F")
+    cols = np.repeat(np.arange(df_ancho.shape[1]), idx.shape[0])
+    return pd.DataFrame({
+        df_ancho.index.name or "fecha": df_ancho.index[filas],
+        columna: np.asarray(df_ancho.columns)[cols],
+        valor: df_ancho.to_numpy()[filas, cols],
+    })
@@ -0,0 +1,240 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+import streamlit as st
+
+# --- PERFILADO POR ETAPAS ---
+# Cada rerun registra cuanto tarda cada etapa con nombre (carga, filtros, groupbys, modelos,
+# graficas) y cuantas veces los caches acertaron o tuvieron que recalcular.
+# Streamlit ejecuta cada sesion en su propio hilo, asi que el registro es local al hilo.
+
+RUTA_LOG = os.environ.get(
+    "PERFILADO_LOG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "perfilado.jsonl")
+)
+
+_local = threading.local()
+
+
+class RegistroRerun:
+    def __init__(self, pagina=None, sesion=None):
+        self.pagina, self.sesion = pagina, sesion
+        self.inicio = time.time()
+        self.etapas = []  # (nombre, segundos)
+        self.llamadas = Counter()
+        self.fallos = Counter()
+        self.cerrado = False  # ya se escribio en el log
+
+    def cache(self):
+        return {
+            nombre: {"aciertos": self.llamadas[nombre] - self.fallos[nombre], "fallos": self.fallos[nombre]}
+            for nombre in self.llamadas
+        }
+
+    def como_dict(self):
+        return {
+            "ts": self.inicio,
+            "sesion": self.sesion,
+            "pagina": self.pagina,
+            "total_s": time.time() - self.inicio,
+            "etapas": [{"etapa": n, "segundos": s} for n, s in self.etapas],
+            "cache": self.cache(),
+            "memoria_cache": presupuesto.resumen(),
+        }
+
+
+def registro_actual():
+    if getattr(_local, "registro", None) is None:
+        _local.registro = RegistroRerun()
+    return _local.registro
+
+
+def iniciar_rerun(pagina=None, sesion=None):
+    _local.registro = RegistroRerun(pagina, sesion)
+    return _local.registro
+
+
+@contextmanager
+def etapa(nombre):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        registro_actual().etapas.append((nombre, time.perf_counter() - t0))
+
+
+def cronometrar(nombre=None):
+    """Mide la funcion como una etapa. Va debajo de @st.fragment: si el fragmento se vuelve a
+    ejecutar solo, el rerun completo ya se cerro y la ejecucion se registra por separado."""
+    def decorador(fn):
+        etiqueta = nombre or fn.__name__
+
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            previo = registro_actual()
+            if not previo.cerrado:
+                with etapa(etiqueta):
+                    return fn(*args, **kwargs)
+            iniciar_rerun(f"{previo.pagina}#{etiqueta}", previo.sesion)
+            try:
+                with etapa(etiqueta):
+                    return fn(*args, **kwargs)
+            finally:
+                finalizar_rerun()
+        return envoltura
+    return decorador
+
+
+# --- PRESUPUESTO DE MEMORIA DE LOS CACHES ---
+# Todas las entradas de los caches medidos se anotan en un libro LRU con su tamaño estimado.
+# Si la suma pasa de CACHE_MAX_MB se descartan las menos usadas recientemente (solo esa
+# entrada, con `clear(*args)`), y al cambiar la version del dataset se descartan de inmediato
+# todas las entradas calculadas para la version anterior.
+LIMITE_CACHE_MB = float(os.environ.get("CACHE_MAX_MB", "2048"))
+
+
+def tamano_bytes(obj, _vistos=None):
+    """Estimacion del tamaño en memoria de un resultado cacheado (DataFrames, arreglos, objetos)."""
+    vistos = _vistos if _vistos is not None else set()
+    if id(obj) in vistos:
+        return 0
+    vistos.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True).sum()) if not isinstance(obj, pd.Index) else int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(tamano_bytes(k, vistos) + tamano_bytes(v, vistos) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(tamano_bytes(v, vistos) for v in obj)
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sys.getsizeof(obj) + tamano_bytes(vars(obj), vistos)
+    return sys.getsizeof(obj)
+
+
+class PresupuestoCache:
+    def __init__(self, limite_mb=LIMITE_CACHE_MB):
+        self.limite = limite_mb * 1e6
+        self.total = 0
+        self._entradas = OrderedDict()  # clave -> (bytes, args, kwargs, limpiar)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(etiqueta, args, kwargs):
+        return (etiqueta, repr(args), repr(sorted(kwargs.items())))
+
+    def registrar(self, clave, valor, args, kwargs, limpiar):
+        tam = tamano_bytes(valor)
+        with self._lock:
+            if clave in self._entradas:
+                self.total -= self._entradas.pop(clave)[0]
+            self._entradas[clave] = (tam, args, kwargs, limpiar)
+            self.total += tam
+
+    def tocar(self, clave):
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+
+    def _descartar(self, claves):
+        with self._lock:
+            fuera = [(c, self._entradas.pop(c)) for c in claves if c in self._entradas]
+            self.total -= sum(e[0] for _, e in fuera)
+        # Se limpia fuera del lock: Streamlit toma sus propios locks al borrar
+        for _, (_, args, kwargs, limpiar) in fuera:
+            limpiar(*args, **kwargs)
+        return len(fuera)
+
+    def recortar(self, conservar=None):
+        """Descarta las entradas menos usadas hasta quedar bajo el limite (nunca `conservar`)."""
+        with self._lock:
+            exceso, victimas = self.total - self.limite, []
+            for c, (tam, *_) in self._entradas.items():
+                if exceso <= 0:
+                    break
+                if c != conservar:
+                    victimas.append(c)
+                    exceso -= tam
+        return self._descartar(victimas)
+
+    def invalidar(self, valor):
+        """Descarta todas las entradas cuyos argumentos incluyen `valor` (p. ej. una version vieja)."""
+        with self._lock:
+            victimas = [c for c, (_, args, kwargs, _) in self._entradas.items()
+                        if any(type(a) is type(valor) and a == valor for a in (*args, *kwargs.values()))]
+        return self._descartar(victimas)
+
+    def resumen(self):
+        with self._lock:
+            return {"entradas": len(self._entradas), "mb": self.total / 1e6, "limite_mb": self.limite / 1e6}
+
+
+presupuesto = PresupuestoCache()
+
+
+def invalidar(valor):
+    return presupuesto.invalidar(valor)
+
+
+def cache_medido(nombre=None, recurso=False, **opciones):
+    """st.cache_data (o st.cache_resource) que cuenta aciertos/fallos, mide cada llamada y
+    anota cada entrada en el presupuesto LRU de memoria."""
+    def decorador(fn):
+        etiqueta = nombre or fn.__name__
+
+        @functools.wraps(fn)
+        def calculo(*args, **kwargs):
+            # El cuerpo solo se ejecuta cuando el cache no tiene el resultado
+            registro_actual().fallos[etiqueta] += 1
+            valor = fn(*args, **kwargs)
+            presupuesto.registrar(PresupuestoCache.clave(etiqueta, args, kwargs), valor, args, kwargs, cacheado.clear)
+            return valor
+
+        cacheado = (st.cache_resource if recurso else st.cache_data)(**opciones)(calculo)
+
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            registro_actual().llamadas[etiqueta] += 1
+            clave = PresupuestoCache.clave(etiqueta, args, kwargs)
+            with etapa(f"cache:{etiqueta}"):
+                valor = cacheado(*args, **kwargs)
+            presupuesto.tocar(clave)
+            presupuesto.recortar(conservar=clave)
+            return valor
+
+        envoltura.clear = cacheado.clear
+        return envoltura
+    return decorador
+
+
+# --- LOG ESTRUCTURADO ---
+def _logger():
+    logger = logging.getLogger("perfilado")
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(RUTA_LOG), exist_ok=True)
+        handler = logging.FileHandler(RUTA_LOG, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def finalizar_rerun():
+    """Cierra el registro del rerun actual y lo escribe como una linea JSON en el log."""
+    registro = registro_actual()
+    registro.cerrado = True
+    datos = registro.como_dict()
+    try:
+        _logger().info(json.dumps(datos, ensure_ascii=False))
+    except OSError:
+        pass  # el log es opcional; sin permisos de escritura solo se muestra en el panel
+    return datos
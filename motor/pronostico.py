@@ -0,0 +1,154 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from motor.calendario import festivos
+from motor.cubo import cubo_por_version
+from motor.perfilado import cache_medido
+
+# --- PRONOSTICO POR LINEA Y TIPO DE PAGO ---
+# Cada serie diaria (linea x tipo de pago) se modela en log con nivel, tendencia lineal,
+# indicador de festivo y armonicos de los ciclos que encuentra la vista de Fourier: semanal
+# (7 dias) y quincenal (~15.2 dias, dos pagos por mes). Todas las series comparten la misma
+# matriz de diseño (el calendario), asi que se ajustan juntas con minimos cuadrados
+# ponderados por bloques: la mascara de dias con dato de cada serie es el peso. Los bloques
+# se reparten en un pool de procesos cuando hay suficientes series; predecir es solo un
+# producto de matrices.
+
+PERIODO_SEMANAL = 7.0
+PERIODO_QUINCENAL = 365.25 / 24
+ARMONICOS = ((PERIODO_SEMANAL, 3), (PERIODO_QUINCENAL, 2))
+VENTANA_AJUSTE = 180   # dias recientes con los que se ajusta cada modelo
+HORIZONTE = 28
+SERIES_POR_BLOQUE = 512
+REGULARIZACION = 1e-6  # ridge minimo: series cortas (lineas nuevas) no dejan el sistema singular
+Z_INTERVALO = 1.96
+
+
+def diseno(dias, origen):
+    """Matriz (dias, k): nivel, tendencia por año desde `origen`, festivo y pares seno/coseno de cada ciclo."""
+    es_festivo = festivos(np.asarray(dias, dtype=np.int64).astype("datetime64[D]"))
+    dias = np.asarray(dias, dtype=np.float64)
+    columnas = [np.ones_like(dias), (dias - origen) / 365.0, es_festivo.astype(np.float64)]
+    for periodo, n in ARMONICOS:
+        for h in range(1, n + 1):
+            angulo = 2 * np.pi * h * dias / periodo
+            columnas += [np.sin(angulo), np.cos(angulo)]
+    return np.column_stack(columnas)
+
+
+def matriz_pago(cubo):
+    """(dias, claves, Y, M): calendario completo, (linea, tipo_pago) de cada serie, afluencia y mascara."""
+    largo = cubo.serie_por_linea_pago()
+    ini, fin = cubo.rango_fechas()
+    dias = np.arange(np.datetime64(ini, "D"), np.datetime64(fin, "D") + 1).astype(np.int64)
+    serie = largo["linea"].cat.codes.to_numpy() * len(largo["tipo_pago"].cat.categories) + largo["tipo_pago"].cat.codes.to_numpy()
+    presentes, columna = np.unique(serie, return_inverse=True)
+    fila = largo["fecha"].to_numpy().astype("datetime64[D]").astype(np.int64) - dias[0]
+
+    Y = np.zeros((len(dias), len(presentes)), dtype=np.float64)
+    M = np.zeros(Y.shape, dtype=bool)
+    Y[fila, columna] = largo["afluencia"].to_numpy()
+    M[fila, columna] = True
+    n_pagos = len(largo["tipo_pago"].cat.categories)
+    claves = pd.DataFrame({
+        "linea": np.asarray(largo["linea"].cat.categories)[presentes // n_pagos],
+        "tipo_pago": np.asarray(largo["tipo_pago"].cat.categories)[presentes % n_pagos],
+    })
+    return dias, claves, Y, M
+
+
+def _ajustar_bloque(X, Y, M):
+    """Minimos cuadrados ponderados para un bloque de series con la misma X (dias, k)."""
+    W = M.astype(np.float64)
+    Z = np.log1p(np.maximum(Y, 0))
+    k = X.shape[1]
+    # Ecuaciones normales de todas las series del bloque a la vez: G[s] = X' W_s X
+    G = np.einsum("dk,ds,dj->skj", X, W, X) + REGULARIZACION * np.eye(k)
+    b = np.einsum("dk,ds->sk", X, W * Z)
+    B = np.linalg.solve(G, b[..., None])[..., 0]
+    n = W.sum(axis=0)
+    residuo = (Z - X @ B.T) * W
+    sigma = np.sqrt((residuo ** 2).sum(axis=0) / np.maximum(n - k, 1))
+    return B, sigma, n
+
+
+def ajustar_modelos(dias, Y, M, fin=None, ventana=VENTANA_AJUSTE, n_procesos=None):
+    """Ajusta todas las series con los `ventana` dias previos a la fila `fin` (exclusiva)."""
+    fin = len(dias) if fin is None else fin
+    ini = max(0, fin - ventana)
+    X = diseno(dias[ini:fin], dias[fin - 1])
+    bloques = [slice(i, i + SERIES_POR_BLOQUE) for i in range(0, Y.shape[1], SERIES_POR_BLOQUE)]
+    n_procesos = n_procesos or os.cpu_count() or 1
+
+    t0 = time.perf_counter()
+    Ys = [Y[ini:fin, b] for b in bloques]
+    Ms = [M[ini:fin, b] for b in bloques]
+    if len(bloques) > 1 and n_procesos > 1:
+        # Cada bloque es independiente; con pocas series el costo de arrancar procesos no se paga
+        with ProcessPoolExecutor(max_workers=min(n_procesos, len(bloques))) as pool:
+            resultados = list(pool.map(_ajustar_bloque, repeat(X), Ys, Ms))
+    else:
+        resultados = [_ajustar_bloque(X, y, m) for y, m in zip(Ys, Ms)]
+    segundos = time.perf_counter() - t0
+
+    if not resultados:
+        k = X.shape[1]
+        resultados = [(np.zeros((0, k)), np.zeros(0), np.zeros(0))]
+    B, sigma, n = (np.concatenate(partes) for partes in zip(*resultados))
+    return {
+        "coeficientes": B, "sigma": sigma, "observaciones": n,
+        "ultimo_dia": int(dias[fin - 1]), "segundos": segundos,
+    }
+
+
+def predecir(modelos, horizonte=HORIZONTE):
+    """(dias futuros, media, inferior, superior) con forma (horizonte, series)."""
+    futuros = modelos["ultimo_dia"] + np.arange(1, horizonte + 1)
+    Z = diseno(futuros, modelos["ultimo_dia"]) @ modelos["coeficientes"].T
+    banda = Z_INTERVALO * modelos["sigma"][None, :]
+    a_escala = lambda z: np.maximum(np.expm1(z), 0)
+    return futuros, a_escala(Z), a_escala(Z - banda), a_escala(Z + banda)
+
+
+def evaluar(dias, claves, Y, M, horizonte=HORIZONTE, ventana=VENTANA_AJUSTE, n_procesos=None):
+    """Backtest: ajusta sin los ultimos `horizonte` dias y compara el pronostico con lo observado."""
+    corte = len(dias) - horizonte
+    modelos = ajustar_modelos(dias, Y, M, fin=corte, ventana=ventana, n_procesos=n_procesos)
+    _, media, _, _ = predecir(modelos, horizonte)
+    real, hay = Y[corte:], M[corte:]
+    error = np.where(hay, np.abs(media - real), 0.0)
+    por_serie = claves.assign(
+        error_abs=error.sum(axis=0),
+        real=np.where(hay, real, 0.0).sum(axis=0),
+        dias=hay.sum(axis=0),
+    )
+    por_serie = por_serie[por_serie["dias"] > 0]
+    # WAPE (error absoluto / total real) tolera dias en cero mejor que el MAPE
+    por_linea = por_serie.groupby("linea", sort=False)[["error_abs", "real"]].sum().reset_index()
+    por_linea["wape_pct"] = 100 * por_linea["error_abs"] / por_linea["real"].where(por_linea["real"] > 0)
+    por_serie = por_serie.assign(wape_pct=100 * por_serie["error_abs"] / por_serie["real"].where(por_serie["real"] > 0))
+    n_series = Y.shape[1]
+    return {
+        "por_linea": por_linea,
+        "por_serie": por_serie,
+        "wape_global_pct": 100 * por_serie["error_abs"].sum() / max(por_serie["real"].sum(), 1),
+        "segundos_ajuste": modelos["segundos"],
+        "series": n_series,
+        "series_por_s": n_series / modelos["segundos"] if modelos["segundos"] else float("inf"),
+    }
+
+
+@cache_medido(recurso=True)
+def calcular_modelos(version):
+    dias, claves, Y, M = matriz_pago(cubo_por_version(version))
+    modelos = ajustar_modelos(dias, Y, M)
+    return {"dias": dias, "claves": claves, "Y": Y, "M": M, "modelos": modelos}
+
+
+@cache_medido()
+def calcular_backtest(version, horizonte=HORIZONTE):
+    datos = calcular_modelos(version)
+    return evaluar(datos["dias"], datos["claves"], datos["Y"], datos["M"], horizonte)
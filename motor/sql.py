@@ -0,0 +1,282 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from utils import (
+    DIR_CACHE, MESES, canonizar_lineas, leer_particion, lineas_particiones, manifiesto_actual, version_datos
+)
+from motor.perfilado import cache_medido
+
+# --- BACKEND SQL EMBEBIDO (OPCIONAL) ---
+# Con AFLUENCIA_BACKEND=sqlite (o duckdb, si esta instalado) la tabla de afluencia vive en un
+# archivo embebido con indice (linea_id, dia) en lugar de un DataFrame por worker. Expone los
+# mismos rollups que CuboAfluencia y la misma `query` que IndiceAfluencia: cada uno es un
+# GROUP BY / WHERE y a Python solo regresa el resultado agregado.
+
+try:
+    import duckdb
+    HAY_DUCKDB = True
+except ImportError:
+    HAY_DUCKDB = False
+
+BACKEND = os.environ.get("AFLUENCIA_BACKEND", "memoria").lower()
+if BACKEND == "duckdb" and not HAY_DUCKDB:
+    BACKEND = "sqlite"
+USAR_SQL = BACKEND in ("sqlite", "duckdb")
+
+ESQUEMA = [
+    "CREATE TABLE lineas (linea_id INTEGER PRIMARY KEY, linea VARCHAR)",
+    "CREATE TABLE tipos_pago (pago_id INTEGER PRIMARY KEY, tipo_pago VARCHAR)",
+    # dia = dias desde 1970-01-01: los rangos de fecha son comparaciones de enteros
+    "CREATE TABLE afluencia (dia INTEGER, linea_id INTEGER, pago_id INTEGER, afluencia BIGINT)",
+]
+INDICES = ["CREATE INDEX idx_linea_dia ON afluencia (linea_id, dia)"]
+# sqlite inserta por lotes: cada lote pasa de numpy a listas de enteros en C (tolist)
+FILAS_POR_LOTE = 100_000
+
+
+def ruta_base(version, motor=BACKEND):
+    return os.path.join(DIR_CACHE, f"base-{version[:16]}.{'duckdb' if motor == 'duckdb' else 'sqlite'}")
+
+
+def _conectar(ruta, motor, solo_lectura=True):
+    if motor == "duckdb":
+        return duckdb.connect(ruta, read_only=solo_lectura)
+    if solo_lectura:
+        return sqlite3.connect(f"file:{ruta}?mode=ro", uri=True, check_same_thread=False)
+    return sqlite3.connect(ruta)
+
+
+def construir_base(manifiesto, version, motor=BACKEND):
+    """Vuelca particion por particion al archivo embebido: nunca hay mas de una en memoria."""
+    os.makedirs(DIR_CACHE, exist_ok=True)
+    destino = ruta_base(version, motor)
+    tmp = destino + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    lineas = lineas_particiones(manifiesto)
+    pagos = sorted(set().union(*(i["tipos_pago"] for i in manifiesto.values())))
+    pos_linea = {l: i for i, l in enumerate(lineas)}
+    pos_pago = {p: i for i, p in enumerate(pagos)}
+
+    con = _conectar(tmp, motor, solo_lectura=False)
+    try:
+        for sql in ESQUEMA:
+            con.execute(sql)
+        con.executemany("INSERT INTO lineas VALUES (?, ?)", list(enumerate(lineas)))
+        con.executemany("INSERT INTO tipos_pago VALUES (?, ?)", list(enumerate(pagos)))
+        for relpath, info in manifiesto.items():
+            df = canonizar_lineas(leer_particion(relpath, info))
+            # Codigos globales remapeando cada categoria una vez
+            l = np.array([pos_linea[c] for c in df["linea"].cat.categories])[df["linea"].cat.codes.to_numpy()]
+            p = np.array([pos_pago[c] for c in df["tipo_pago"].cat.categories])[df["tipo_pago"].cat.codes.to_numpy()]
+            parte = pd.DataFrame({
+                "dia": df["fecha"].to_numpy().astype("datetime64[D]").astype(np.int64),
+                "linea_id": l.astype(np.int64),
+                "pago_id": p.astype(np.int64),
+                "afluencia": df["afluencia"].to_numpy().astype(np.int64),
+            })
+            if motor == "duckdb":
+                con.register("parte", parte)
+                con.execute("INSERT INTO afluencia SELECT * FROM parte")
+                con.unregister("parte")
+            else:
+                filas = parte.to_numpy()
+                for i in range(0, len(filas), FILAS_POR_LOTE):
+                    con.executemany("INSERT INTO afluencia VALUES (?, ?, ?, ?)", filas[i:i + FILAS_POR_LOTE].tolist())
+        # El indice se crea al final: insertar en bloque sin indice es mucho mas rapido
+        for sql in INDICES:
+            con.execute(sql)
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp, destino)
+
+    # Limpiamos bases de versiones anteriores
+    for nombre in os.listdir(DIR_CACHE):
+        p = os.path.join(DIR_CACHE, nombre)
+        if nombre.startswith("base-") and p != destino and not nombre.endswith(".tmp"):
+            os.remove(p)
+    return destino
+
+
+def _a_fechas(dias):
+    return pd.to_datetime(np.asarray(dias, dtype=np.int64).astype("datetime64[D]"))
+
+
+class BaseAfluencia:
+    def __init__(self, ruta, motor=BACKEND):
+        self.ruta, self.motor = ruta, motor
+        self.lineas = self._sql("SELECT linea FROM lineas ORDER BY linea_id")["linea"].tolist()
+        self.tipos_pago = self._sql("SELECT tipo_pago FROM tipos_pago ORDER BY pago_id")["tipo_pago"].tolist()
+
+    def _sql(self, sql, params=()):
+        # Una conexion de solo lectura por consulta: los reruns corren en hilos distintos
+        con = _conectar(self.ruta, self.motor)
+        try:
+            if self.motor == "duckdb":
+                return con.execute(sql, list(params)).df()
+            return pd.read_sql_query(sql, con, params=list(params))
+        finally:
+            con.close()
+
+    def _filtro(self, lineas=None, inicio=None, fin=None):
+        condiciones, params = [], []
+        if lineas is not None:
+            ids = [self.lineas.index(l) for l in lineas if l in self.lineas] or [-1]
+            condiciones.append(f"linea_id IN ({', '.join('?' * len(ids))})")
+            params += ids
+        if inicio is not None:
+            condiciones.append("dia >= ?")
+            params.append(int(np.datetime64(inicio, "D").astype(np.int64)))
+        if fin is not None:
+            condiciones.append("dia <= ?")
+            params.append(int(np.datetime64(fin, "D").astype(np.int64)))
+        return ("WHERE " + " AND ".join(condiciones)) if condiciones else "", params
+
+    def _nombres(self, lineas=None):
+        return self.lineas if lineas is None else [l for l in lineas if l in self.lineas]
+
+    def _posiciones(self, lineas=None):
+        # Posicion de cada linea_id dentro de la seleccion: el cubo respeta el orden pedido
+        pos = np.full(len(self.lineas), len(self.lineas), dtype=np.int64)
+        for i, n in enumerate(self._nombres(lineas)):
+            pos[self.lineas.index(n)] = i
+        return pos
+
+    def _por_seleccion(self, r, lineas=None, *antes):
+        # Reordena el resultado (ya ordenado por linea_id) segun el orden de `lineas`
+        pos = self._posiciones(lineas)[r["linea_id"].to_numpy(dtype=np.int64)]
+        return r.iloc[np.lexsort((pos,) + tuple(r[c].to_numpy() for c in antes))].reset_index(drop=True)
+
+    # --- ROLLUPS (misma interfaz que CuboAfluencia) ---
+    def rango_fechas(self):
+        r = self._sql("SELECT MIN(dia) AS ini, MAX(dia) AS fin FROM afluencia")
+        if r["ini"].isna().all(): return None, None
+        ini, fin = _a_fechas([r["ini"].iloc[0], r["fin"].iloc[0]])
+        return ini.date(), fin.date()
+
+    def dias_con_datos(self, lineas=None, inicio=None, fin=None):
+        where, params = self._filtro(lineas, inicio, fin)
+        return int(self._sql(f"SELECT COUNT(DISTINCT dia) AS n FROM afluencia {where}", params)["n"].iloc[0])
+
+    def serie_por_linea(self, lineas=None, inicio=None, fin=None):
+        where, params = self._filtro(lineas, inicio, fin)
+        r = self._sql(
+            f"SELECT dia, linea_id, SUM(afluencia) AS afluencia FROM afluencia {where} "
+            "GROUP BY dia, linea_id ORDER BY dia, linea_id", params
+        )
+        r = self._por_seleccion(r, lineas, "dia")
+        return pd.DataFrame({
+            "fecha": _a_fechas(r["dia"]),
+            "linea": pd.Categorical.from_codes(self._posiciones(lineas)[r["linea_id"].to_numpy(dtype=np.int64)],
+                                               categories=self._nombres(lineas)),
+            "afluencia": r["afluencia"].to_numpy(dtype=np.int64),
+        })
+
+    def serie_por_linea_pago(self, lineas=None, inicio=None, fin=None):
+        where, params = self._filtro(lineas, inicio, fin)
+        r = self._sql(
+            f"SELECT dia, linea_id, pago_id, SUM(afluencia) AS afluencia FROM afluencia {where} "
+            "GROUP BY dia, linea_id, pago_id ORDER BY dia, linea_id, pago_id", params
+        )
+        pos = self._posiciones(lineas)[r["linea_id"].to_numpy(dtype=np.int64)]
+        r = r.iloc[np.lexsort((r["pago_id"].to_numpy(), pos, r["dia"].to_numpy()))].reset_index(drop=True)
+        return pd.DataFrame({
+            "fecha": _a_fechas(r["dia"]),
+            "linea": pd.Categorical.from_codes(self._posiciones(lineas)[r["linea_id"].to_numpy(dtype=np.int64)],
+                                               categories=self._nombres(lineas)),
+            "tipo_pago": pd.Categorical.from_codes(r["pago_id"].to_numpy(dtype=np.int64), categories=self.tipos_pago),
+            "afluencia": r["afluencia"].to_numpy(dtype=np.int64),
+        })
+
+    def serie_diaria(self, lineas=None, inicio=None, fin=None):
+        where, params = self._filtro(lineas, inicio, fin)
+        r = self._sql(f"SELECT dia, SUM(afluencia) AS afluencia FROM afluencia {where} GROUP BY dia ORDER BY dia", params)
+        return pd.DataFrame({"fecha": _a_fechas(r["dia"]), "afluencia": r["afluencia"].to_numpy(dtype=np.int64)})
+
+    def matriz_lineas(self, lineas=None, inicio=None, fin=None):
+        largo = self.serie_por_linea(lineas, inicio, fin)
+        ancho = largo.pivot_table(index="fecha", columns="linea", values="afluencia", aggfunc="sum", observed=True).fillna(0)
+        ancho.columns = pd.Index(list(ancho.columns), name="linea")
+        return ancho.astype(np.int64)
+
+    def total_por_linea(self, lineas=None, inicio=None, fin=None):
+        where, params = self._filtro(lineas, inicio, fin)
+        r = self._sql(f"SELECT linea_id, SUM(afluencia) AS afluencia FROM afluencia {where} GROUP BY linea_id ORDER BY linea_id", params)
+        r = self._por_seleccion(r, lineas)
+        return pd.DataFrame({"linea": np.array(self.lineas)[r["linea_id"].to_numpy(dtype=np.int64)],
+                             "afluencia": r["afluencia"].to_numpy(dtype=np.int64)})
+
+    def total_por_pago(self, lineas=None, inicio=None, fin=None):
+        where, params = self._filtro(lineas, inicio, fin)
+        r = self._sql(f"SELECT pago_id, SUM(afluencia) AS afluencia FROM afluencia {where} GROUP BY pago_id ORDER BY pago_id", params)
+        return pd.DataFrame({"tipo_pago": np.array(self.tipos_pago)[r["pago_id"].to_numpy(dtype=np.int64)],
+                             "afluencia": r["afluencia"].to_numpy(dtype=np.int64)})
+
+    def linea_por_pago(self, lineas=None, inicio=None, fin=None):
+        where, params = self._filtro(lineas, inicio, fin)
+        r = self._sql(
+            f"SELECT linea_id, pago_id, SUM(afluencia) AS afluencia FROM afluencia {where} "
+            "GROUP BY linea_id, pago_id ORDER BY linea_id, pago_id", params
+        )
+        r = self._por_seleccion(r, lineas)
+        return pd.DataFrame({
+            "linea": np.array(self.lineas)[r["linea_id"].to_numpy(dtype=np.int64)],
+            "tipo_pago": np.array(self.tipos_pago)[r["pago_id"].to_numpy(dtype=np.int64)],
+            "afluencia": r["afluencia"].to_numpy(dtype=np.int64),
+        })
+
+    def estadisticas_por_linea(self, lineas=None, inicio=None, fin=None):
+        """Promedio, desviacion (muestral), total y pico por linea sobre las celdas dia/linea/pago."""
+        where, params = self._filtro(lineas, inicio, fin)
+        r = self._sql(
+            "SELECT linea_id, COUNT(*) AS n, SUM(v) AS total, SUM(v * v) AS cuadrados, MAX(v) AS pico FROM ("
+            f"  SELECT linea_id, CAST(SUM(afluencia) AS DOUBLE) AS v FROM afluencia {where}"
+            "   GROUP BY dia, linea_id, pago_id"
+            ") GROUP BY linea_id ORDER BY linea_id", params
+        )
+        r = self._por_seleccion(r, lineas)
+        n, total = r["n"].to_numpy(dtype=np.float64), r["total"].to_numpy(dtype=np.float64)
+        media = total / n
+        var = np.divide(r["cuadrados"].to_numpy(dtype=np.float64) - n * media ** 2, n - 1,
+                        out=np.zeros_like(total), where=n > 1)
+        return pd.DataFrame({
+            "linea": np.array(self.lineas)[r["linea_id"].to_numpy(dtype=np.int64)],
+            "promedio_diario": media,
+            "desviacion_estandar": np.sqrt(np.maximum(var, 0)),
+            "total_acumulado": total,
+            "pico_maximo": r["pico"].to_numpy(dtype=np.float64),
+        })
+
+    # --- FILAS (misma interfaz que IndiceAfluencia.query) ---
+    def query(self, lineas=None, inicio=None, fin=None):
+        where, params = self._filtro(lineas, inicio, fin)
+        r = self._sql(f"SELECT dia, linea_id, pago_id, afluencia FROM afluencia {where} ORDER BY linea_id, dia", params)
+        fechas = _a_fechas(r["dia"])
+        ids = r["linea_id"].to_numpy(dtype=np.int64)
+        return pd.DataFrame({
+            "fecha": fechas,
+            "mes": pd.Categorical.from_codes(fechas.month - 1, categories=MESES, ordered=True),
+            "anio": fechas.year.to_numpy().astype(np.int16),
+            "linea": pd.Categorical.from_codes(ids, categories=self.lineas),
+            "tipo_pago": pd.Categorical.from_codes(r["pago_id"].to_numpy(dtype=np.int64), categories=self.tipos_pago),
+            "afluencia": r["afluencia"].to_numpy(dtype=np.int64),
+            "linea_id": ids.astype(np.int16),
+        })
+
+    def reporte(self):
+        return {"motor": self.motor, "archivo_mb": os.path.getsize(self.ruta) / 1e6}
+
+
+@cache_medido(recurso=True)
+def base_por_version(version):
+    ruta = ruta_base(version)
+    if not os.path.exists(ruta):
+        construir_base(manifiesto_actual(), version)
+    return BaseAfluencia(ruta)
+
+
+def cargar_base():
+    return base_por_version(version_datos())
@@ -1,8 +1,450 @@
+import hashlib
+import json
+import os
+import numpy as np
 import pandas as pd
-import streamlit as st
+from pandas.api.types import union_categoricals
+from motor.perfilado import cache_medido, invalidar
 
-@st.cache_data
-def cargar_datos():
-    df = pd.read_csv("data/afluencia-mb-2025.csv")
+# --- RUTAS ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+RUTA_CSV = os.path.join(ROOT_DIR, "data", "afluencia-mb-2025.csv")
+DIR_CACHE = os.path.join(ROOT_DIR, "data", "cache")
+
+# Si cambia la etapa de ingesta, se incrementa para invalidar los snapshots
+VERSION_PIPELINE = "3"
+
+MESES = [
+    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+    "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+]
+
+# --- RECURSOS COMPARTIDOS DE LINEAS ---
+IMAGENES = {
+    "Línea 1": "MB-1.png", "Línea 2": "MB-2.png", "Línea 3": "MB-3.png",
+    "Línea 4": "MB-4.png", "Línea 5": "MB-5.png", "Línea 6": "MB-6.png",
+    "Línea 7": "MB-7.png", "Emergente": "ícono-MB.png"
+}
+
+COLOR_MAP = {
+    'Línea 1': '#B5261E', 'Línea 2': '#6A1B9A', 'Línea 3': '#7CB342',
+    'Línea 4': '#EF6C00', 'Línea 5': '#0288D1', 'Línea 6': '#D81B60',
+    'Línea 7': '#2E7D32', 'Emergente': '#616161'
+}
+
+
+# --- ICONOS ---
+# Las rutas se resuelven con un solo listado de cada carpeta y las imagenes se cargan una vez
+# por proceso, ya reducidas: las vistas no tocan el disco en cada rerun.
+DIRS_IMAGENES = [os.path.join(ROOT_DIR, "imagenes"), ROOT_DIR]
+EXTENSIONES_IMAGEN = (".png", ".jpg", ".jpeg", ".webp")
+LADO_ICONO = 140  # px: el doble del mayor ancho con que se muestran (pantallas de alta densidad)
+ICONO_SISTEMA = "ícono-MB.png"
+
+_RUTAS_IMAGENES = None
+
+
+def rutas_imagenes():
+    """{archivo: ruta}; la primera carpeta de DIRS_IMAGENES tiene prioridad."""
+    global _RUTAS_IMAGENES
+    if _RUTAS_IMAGENES is None:
+        rutas = {}
+        for carpeta in reversed(DIRS_IMAGENES):
+            if os.path.isdir(carpeta):
+                rutas.update({e.name: e.path for e in os.scandir(carpeta)
+                              if e.is_file() and e.name.lower().endswith(EXTENSIONES_IMAGEN)})
+        _RUTAS_IMAGENES = rutas
+    return _RUTAS_IMAGENES
+
+
+@cache_medido(recurso=True)
+def iconos(lado=LADO_ICONO):
+    """Registro en memoria {archivo: miniatura PIL} de todas las imagenes disponibles."""
+    from PIL import Image  # dependencia de Streamlit; solo se importa al armar el registro
+    registro = {}
+    for nombre, ruta in rutas_imagenes().items():
+        try:
+            with Image.open(ruta) as img:
+                img = img.convert("RGBA")
+                img.thumbnail((lado, lado), Image.LANCZOS)
+                registro[nombre] = img
+        except OSError:
+            pass  # archivo danado o no es imagen: la vista dibuja el circulo de color
+    return registro
+
+
+def icono(imagen):
+    """Miniatura del archivo `imagen` (columna de la dimension de lineas) o la del sistema; None si no hay ninguna."""
+    registro = iconos()
+    img = registro.get(imagen)
+    return img if img is not None else registro.get(ICONO_SISTEMA)
+
+
+def normalizar_linea(texto):
+    if not isinstance(texto, str): return str(texto)
+    t = texto.strip().title()
+    if "Linea" in t and "Línea" not in t: t = t.replace("Linea", "Línea")
+    return t
+
+
+# --- SNAPSHOT COLUMNAR ---
+# Cada particion se parsea una sola vez; despues se lee un Parquet con tipos compactos
+# cuyo nombre incluye el hash del contenido del CSV (si el CSV cambia, se regenera).
+try:
+    import pyarrow as pa
+    HAY_PARQUET = True
+except ImportError:
+    HAY_PARQUET = False
+
+# Tipos forzados al leer cada bloque: si un archivo trae columnas mal formadas, falla al leerlo
+DTYPES_CSV = {"fecha": str, "mes": str, "anio": "int16", "linea": str, "tipo_pago": str, "afluencia": "float64"}
+FILAS_POR_BLOQUE = 250_000
+
+
+def hash_archivo(ruta, bloque=1 << 20):
+    h = hashlib.sha256(VERSION_PIPELINE.encode())
+    with open(ruta, "rb") as f:
+        for chunk in iter(lambda: f.read(bloque), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def compactar_tipos(df):
+    # fecha -> datetime64, texto repetido -> category, afluencia -> entero minimo
     df["fecha"] = pd.to_datetime(df["fecha"])
+    for col in ["linea", "tipo_pago"]:
+        df[col] = df[col].astype("category")
+    df["mes"] = pd.Categorical(df["mes"], categories=MESES, ordered=True)
+    df["anio"] = pd.to_numeric(df["anio"], downcast="integer")
+    afl = df["afluencia"].fillna(0).round()
+    df["afluencia"] = pd.to_numeric(afl.astype("int64"), downcast="integer")
+    return df
+
+
+def canonizar_lineas(df):
+    # Se normaliza cada categoria una sola vez (no cada fila) y se remapean los codigos,
+    # de modo que "Linea 1" y "Línea 1" terminan en la misma categoria.
+    cat = df["linea"].astype("category").cat
+    nombres = [normalizar_linea(c) for c in cat.categories]
+    canon = sorted(set(nombres))
+    remap = np.array([canon.index(n) for n in nombres] + [-1], dtype="int16")
+    codigos = remap[cat.codes.to_numpy()]  # el -1 (nulo) apunta al ultimo elemento
+    df["linea"] = pd.Categorical.from_codes(codigos, categories=canon)
+    df["linea_id"] = pd.to_numeric(codigos, downcast="integer")
     return df
+
+
+def concatenar(partes):
+    """pd.concat que conserva las columnas categoricas aunque cada parte tenga otras categorias."""
+    if len(partes) == 1:
+        return partes[0].reset_index(drop=True)
+    columnas = {}
+    for col in partes[0].columns:
+        series = [p[col] for p in partes]
+        if isinstance(series[0].dtype, pd.CategoricalDtype) and not series[0].cat.ordered:
+            columnas[col] = union_categoricals(series)
+        else:
+            columnas[col] = pd.concat(series, ignore_index=True)
+    return pd.DataFrame(columnas)
+
+
+def construir_dim_lineas(lineas):
+    return pd.DataFrame({
+        "linea_id": np.arange(len(lineas), dtype="int16"),
+        "linea": lineas,
+        "etiqueta": [l.replace("Línea ", "L") for l in lineas],
+        "color": [COLOR_MAP.get(l, "#555") for l in lineas],
+        "imagen": [IMAGENES.get(l, "ícono-MB.png") for l in lineas],
+    })
+
+
+def en_rango(fechas, inicio=None, fin=None):
+    mascara = np.ones(len(fechas), dtype=bool)
+    if inicio is not None:
+        mascara &= (fechas >= pd.Timestamp(inicio)).to_numpy()
+    if fin is not None:
+        mascara &= (fechas <= pd.Timestamp(fin)).to_numpy()
+    return mascara
+
+
+def leer_csv(ruta=RUTA_CSV, inicio=None, fin=None, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Lee un CSV por bloques: cada bloque se compacta (y se filtra por fecha) antes de leer el siguiente."""
+    partes, bytes_original = [], 0
+    # --- ETAPA DE INGESTA (una vez por version de cada particion) ---
+    for bloque in pd.read_csv(ruta, usecols=list(DTYPES_CSV), dtype=DTYPES_CSV, chunksize=filas_por_bloque):
+        bytes_original += int(bloque.memory_usage(deep=True).sum())
+        bloque = compactar_tipos(bloque)
+        if inicio is not None or fin is not None:
+            bloque = bloque[en_rango(bloque["fecha"], inicio, fin)]
+        partes.append(bloque)
+    df = canonizar_lineas(concatenar(partes))
+    return df, bytes_original
+
+
+def ruta_snapshot(version):
+    return os.path.join(DIR_CACHE, f"afluencia-{version[:16]}.parquet")
+
+
+def escribir_snapshot(df, version):
+    os.makedirs(DIR_CACHE, exist_ok=True)
+    destino = ruta_snapshot(version)
+    # Se escribe a un temporal y se renombra para no dejar snapshots a medias
+    tmp = destino + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, destino)
+    return destino
+
+
+def limpiar_snapshots(vigentes):
+    # Borra los snapshots de particiones que ya cambiaron o desaparecieron
+    if not os.path.isdir(DIR_CACHE):
+        return
+    for nombre in os.listdir(DIR_CACHE):
+        p = os.path.join(DIR_CACHE, nombre)
+        if nombre.startswith("afluencia-") and p not in vigentes:
+            os.remove(p)
+
+
+# --- DATASET PARTICIONADO ---
+# Cada CSV bajo data/ (uno por mes, por año o el historico completo) es una particion.
+# Un manifiesto guarda por archivo su tamaño/mtime, hash, rango de fechas y filas:
+# los archivos nuevos se descubren solos y los que no cambiaron no se vuelven a hashear.
+# Una consulta por rango solo abre las particiones que se traslapan con el.
+DIR_DATOS = os.path.join(ROOT_DIR, "data")
+RUTA_MANIFIESTO = os.path.join(DIR_CACHE, "particiones.json")
+
+
+def descubrir_particiones():
+    """(ruta relativa, tamaño, mtime_ns) de cada CSV bajo data/, sin abrirlos."""
+    firmas = []
+    for raiz, dirs, archivos in os.walk(DIR_DATOS):
+        dirs[:] = sorted(d for d in dirs if os.path.join(raiz, d) != DIR_CACHE)
+        for nombre in sorted(archivos):
+            if nombre.lower().endswith(".csv"):
+                ruta = os.path.join(raiz, nombre)
+                info = os.stat(ruta)
+                firmas.append((os.path.relpath(ruta, DIR_DATOS), info.st_size, info.st_mtime_ns))
+    return tuple(firmas)
+
+
+def leer_manifiesto():
+    try:
+        with open(RUTA_MANIFIESTO) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_manifiesto(manifiesto):
+    os.makedirs(DIR_CACHE, exist_ok=True)
+    tmp = RUTA_MANIFIESTO + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifiesto, f, indent=1, sort_keys=True)
+    os.replace(tmp, RUTA_MANIFIESTO)
+
+
+def ingerir_particion(relpath, tamano, mtime_ns, info=None):
+    """Hashea y, si hace falta, parsea la particion; devuelve su entrada del manifiesto."""
+    if not info or info.get("tamano") != tamano or info.get("mtime_ns") != mtime_ns:
+        info = {"tamano": tamano, "mtime_ns": mtime_ns, "hash": hash_archivo(os.path.join(DIR_DATOS, relpath))}
+    if "lineas" in info and (not HAY_PARQUET or os.path.exists(ruta_snapshot(info["hash"]))):
+        return info
+
+    df, bytes_original = leer_csv(os.path.join(DIR_DATOS, relpath))
+    if HAY_PARQUET:
+        escribir_snapshot(df, info["hash"])
+    return dict(info, inicio=str(df["fecha"].min().date()), fin=str(df["fecha"].max().date()),
+                filas=len(df), bytes_original=bytes_original,
+                lineas=list(df["linea"].cat.categories), tipos_pago=list(df["tipo_pago"].cat.categories))
+
+
+def leer_particion(relpath, info, inicio=None, fin=None):
+    if not HAY_PARQUET:
+        return leer_csv(os.path.join(DIR_DATOS, relpath), inicio, fin)[0]
+    filtros = []
+    if inicio is not None:
+        filtros.append(("fecha", ">=", pd.Timestamp(inicio)))
+    if fin is not None:
+        filtros.append(("fecha", "<=", pd.Timestamp(fin)))
+    return pd.read_parquet(ruta_snapshot(info["hash"]), filters=filtros or None)
+
+
+def se_traslapa(info, inicio=None, fin=None):
+    return ((fin is None or pd.Timestamp(info["inicio"]) <= pd.Timestamp(fin)) and
+            (inicio is None or pd.Timestamp(info["fin"]) >= pd.Timestamp(inicio)))
+
+
+def version_particiones(manifiesto):
+    h = hashlib.sha256(VERSION_PIPELINE.encode())
+    for relpath in sorted(manifiesto):
+        h.update(f"{relpath}:{manifiesto[relpath]['hash']}\n".encode())
+    return h.hexdigest()
+
+
+def sincronizar_particiones():
+    """Ingiere las particiones nuevas o modificadas y devuelve el manifiesto vigente, sin cargar datos."""
+    anterior = leer_manifiesto()
+    manifiesto = {
+        relpath: ingerir_particion(relpath, tamano, mtime_ns, anterior.get(relpath))
+        for relpath, tamano, mtime_ns in descubrir_particiones()
+    }
+    if not manifiesto:
+        raise FileNotFoundError(f"No hay archivos CSV en {DIR_DATOS}")
+    if manifiesto != anterior:
+        guardar_manifiesto(manifiesto)
+        if HAY_PARQUET:
+            limpiar_snapshots({ruta_snapshot(i["hash"]) for i in manifiesto.values()})
+    return manifiesto
+
+
+def lineas_particiones(manifiesto):
+    return sorted(set().union(*(i["lineas"] for i in manifiesto.values())))
+
+
+def cargar_particiones(inicio=None, fin=None):
+    """Devuelve (df, version, bytes_original) de las particiones que se traslapan con [inicio, fin]."""
+    manifiesto = sincronizar_particiones()
+    partes, bytes_original = [], 0
+    for relpath, info in manifiesto.items():
+        if se_traslapa(info, inicio, fin):
+            partes.append(leer_particion(relpath, info, inicio, fin))
+            bytes_original += info["bytes_original"]
+    if not partes:
+        # Ninguna particion cae en el rango: DataFrame vacio con el mismo esquema
+        relpath, info = next(iter(manifiesto.items()))
+        partes = [leer_particion(relpath, info, inicio=pd.Timestamp.max)]
+    # Las categorias de linea se unifican sobre todas las particiones leidas
+    df = canonizar_lineas(concatenar(partes))
+    return df, version_particiones(manifiesto), bytes_original
+
+
+# --- DATASET COMPARTIDO (ARROW MAPEADO EN MEMORIA) ---
+# La tabla consolidada se escribe una vez por version como Arrow IPC sin comprimir, ya
+# ordenada por (linea_id, fecha). Cada proceso la abre con mmap y pandas envuelve los buffers
+# sin copiarlos: los workers comparten las mismas paginas del sistema operativo y las
+# sesiones de un proceso comparten el mismo DataFrame (de solo lectura).
+def ruta_dataset(version):
+    return os.path.join(DIR_CACHE, f"dataset-{version[:16]}.arrow")
+
+
+def ordenar_por_linea(df):
+    orden = np.lexsort((df["fecha"].to_numpy(), df["linea_id"].to_numpy()))
+    return df.iloc[orden].reset_index(drop=True)
+
+
+def escribir_dataset(df, version):
+    os.makedirs(DIR_CACHE, exist_ok=True)
+    destino = ruta_dataset(version)
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    tmp = destino + ".tmp"
+    with pa.OSFile(tmp, "wb") as f, pa.ipc.new_file(f, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    os.replace(tmp, destino)
+    # Otros workers pueden seguir mapeando la version anterior: en POSIX borrar no invalida el mmap
+    for nombre in os.listdir(DIR_CACHE):
+        p = os.path.join(DIR_CACHE, nombre)
+        if nombre.startswith("dataset-") and p != destino:
+            os.remove(p)
+    return destino
+
+
+def mapear_dataset(ruta):
+    tabla = pa.ipc.open_file(pa.memory_map(ruta)).read_all()
+    # split_blocks evita consolidar columnas (lo que copiaria); los arreglos quedan de solo lectura
+    return tabla.to_pandas(split_blocks=True)
+
+
+def solo_lectura(df):
+    # Sin pyarrow la tabla vive en el heap: se protege igual contra escrituras accidentales
+    for col in df.columns:
+        serie = df[col]
+        arr = serie.cat.codes.to_numpy() if isinstance(serie.dtype, pd.CategoricalDtype) else serie.to_numpy()
+        arr.flags.writeable = False
+    return df
+
+
+def cargar_compartido():
+    """Devuelve (df, version, bytes_original) con el dataset completo mapeado desde su snapshot Arrow."""
+    manifiesto = sincronizar_particiones()
+    version = version_particiones(manifiesto)
+    bytes_original = sum(i["bytes_original"] for i in manifiesto.values())
+    if not HAY_PARQUET:
+        df, _, _ = cargar_particiones()
+        return solo_lectura(ordenar_por_linea(df)), version, bytes_original
+    ruta = ruta_dataset(version)
+    if not os.path.exists(ruta):
+        df, _, _ = cargar_particiones()
+        escribir_dataset(ordenar_por_linea(df), version)
+        del df
+    return mapear_dataset(ruta), version, bytes_original
+
+
+def reporte_memoria(df, bytes_original):
+    bytes_actual = int(df.memory_usage(deep=True).sum())
+    ahorro = 1 - bytes_actual / bytes_original if bytes_original else 0.0
+    return {
+        "original_mb": bytes_original / 1e6,
+        "compacto_mb": bytes_actual / 1e6,
+        "ahorro_pct": ahorro * 100,
+    }
+
+
+# --- CARGA PRINCIPAL ---
+# Todos los caches derivados se llaman con la firma de los archivos o con la version del
+# dataset. Cuando cualquiera de las dos cambia, las entradas de la anterior se descartan
+# juntas en lugar de quedarse en memoria hasta que las saque el LRU.
+_vigentes = {}
+
+
+def _renovar(tipo, valor):
+    anterior = _vigentes.get(tipo)
+    _vigentes[tipo] = valor
+    if anterior is not None and anterior != valor:
+        invalidar(anterior)
+    return valor
+
+
+@cache_medido()
+def _manifiesto(firma):
+    # `firma` (archivos, tamaños y mtimes) solo sirve de llave: cambia al llegar una particion
+    return sincronizar_particiones()
+
+
+def firma_actual():
+    return _renovar("firma", descubrir_particiones())
+
+
+def manifiesto_actual():
+    return _manifiesto(firma_actual())
+
+
+@cache_medido(recurso=True)
+def _cargar_datos(firma):
+    # cache_resource: un solo DataFrame por proceso, sin la copia que st.cache_data
+    # entregaria a cada llamada
+    df, version, bytes_original = cargar_compartido()
+    return df, version, reporte_memoria(df, bytes_original)
+
+
+def cargar_datos_con_reporte():
+    return _cargar_datos(firma_actual())
+
+
+def cargar_datos():
+    return cargar_datos_con_reporte()[0]
+
+
+@cache_medido()
+def dim_lineas_por_version(version):
+    # Tabla de dimension compartida: codigo entero, nombre canonico, color e icono
+    return construir_dim_lineas(lineas_particiones(manifiesto_actual()))
+
+
+def cargar_dim_lineas():
+    return dim_lineas_por_version(version_datos())
+
+
+def version_datos():
+    # Hash de las particiones + pipeline; sirve de llave para todos los caches derivados.
+    # Sale del manifiesto: no hace falta tener la tabla en memoria para conocerla.
+    return _renovar("version", version_particiones(manifiesto_actual()))
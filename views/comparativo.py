@@ -0,0 +1,139 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from motor.comparativo import SISTEMA, cargar_comparativo
+from motor.estadisticas import DIAS_SEMANA
+from motor.perfilado import etapa
+from utils import MESES, cargar_dim_lineas
+
+
+def formato_delta(valor):
+    return "s/d" if pd.isna(valor) else f"{valor:+.1f}%"
+
+
+def show_comparativo():
+    st.title("Comparativo Anual")
+    st.markdown("""
+    Cada semana se compara con la **misma semana ISO del año anterior**, dia de la semana contra dia de la semana
+    (lunes con lunes), y solo en los dias con datos en ambos años. Los dias festivos se marcan y pueden excluirse.
+    """)
+
+    try:
+        with etapa("comparativo.carga"):
+            comp = cargar_comparativo()
+    except Exception as e:
+        st.error(f"Error cargando datos: {e}")
+        return
+    dim = cargar_dim_lineas()
+    colores = {**dict(zip(dim["linea"], dim["color"])), SISTEMA: "#333333"}
+
+    ultima = comp.ultima_semana()
+    if ultima is None or len(comp.anios) < 2:
+        st.warning("Se necesitan al menos dos años con datos para comparar.")
+        return
+
+    # --- FILTROS ---
+    st.sidebar.header("Configuracion")
+    anios = [int(a) for a in comp.anios[1:]]
+    anio = st.sidebar.selectbox("Año ISO", anios, index=anios.index(ultima[0]) if ultima[0] in anios else len(anios) - 1)
+    semanas = comp.semanas(anio)
+    semana_def = ultima[1] if anio == ultima[0] else semanas[-1]
+    semana = st.sidebar.selectbox("Semana ISO", semanas, index=semanas.index(semana_def) if semana_def in semanas else 0)
+    excluir = st.sidebar.checkbox("Excluir dias festivos", value=False)
+
+    # --- 1. SEMANA CONTRA LA MISMA SEMANA DEL AÑO ANTERIOR ---
+    st.header(f"Semana {semana} de {anio} vs. {anio - 1}")
+    with etapa("comparativo.semana"):
+        df_sem = comp.comparar_semana(anio, semana, excluir_festivos=excluir)
+    sistema = df_sem[df_sem["linea"] == SISTEMA].iloc[0]
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Sistema (Semana Actual)", f"{sistema['actual']:,.0f}", formato_delta(sistema["delta_pct"]))
+    c2.metric("Misma Semana Año Anterior", f"{sistema['anterior']:,.0f}")
+    c3.metric("Dias Comparados", f"{sistema['dias']}", help=f"Festivos: {sistema['festivos']} esta semana, {sistema['festivos_anterior']} el año anterior")
+
+    c_barras, c_detalle = st.columns(2)
+    with c_barras:
+        df_lin = df_sem[df_sem["linea"] != SISTEMA]
+        fig_delta = px.bar(
+            df_lin, x="linea", y="delta_pct", color="linea", color_discrete_map=colores,
+            labels={"delta_pct": "Variacion YoY (%)", "linea": "Linea"}, title="Variacion por Linea"
+        )
+        fig_delta.update_layout(showlegend=False, template="plotly_white")
+        st.plotly_chart(fig_delta, use_container_width=True)
+
+    with c_detalle:
+        linea_sel = st.selectbox("Detalle por dia", comp.entidades, index=len(comp.entidades) - 1)
+        det = comp.detalle_semana(linea_sel, anio, semana)
+        etiquetas = [DIAS_SEMANA[d] + (" *" if f or fa else "") for d, f, fa in zip(det["dia"], det["festivo"], det["festivo_anterior"])]
+        fig_dias = go.Figure()
+        fig_dias.add_bar(x=etiquetas, y=det["afluencia_anterior"], name=str(anio - 1), marker_color="#bdc3c7",
+                         customdata=det["fecha_anterior"].dt.strftime("%Y-%m-%d"), hovertemplate="%{customdata}: %{y:,.0f}<extra></extra>")
+        fig_dias.add_bar(x=etiquetas, y=det["afluencia"], name=str(anio), marker_color=colores.get(linea_sel, "#2980b9"),
+                         customdata=det["fecha"].dt.strftime("%Y-%m-%d"), hovertemplate="%{customdata}: %{y:,.0f}<extra></extra>")
+        fig_dias.update_layout(barmode="group", template="plotly_white", title=f"{linea_sel} dia por dia (* = festivo)",
+                               legend=dict(orientation="h", y=1.1))
+        st.plotly_chart(fig_dias, use_container_width=True)
+
+    st.dataframe(
+        df_sem[["linea", "actual", "anterior", "dias", "delta_pct"]]
+        .rename(columns={"linea": "Linea", "actual": f"Semana {anio}", "anterior": f"Semana {anio - 1}", "dias": "Dias", "delta_pct": "Variacion (%)"})
+        .style.format({f"Semana {anio}": "{:,.0f}", f"Semana {anio - 1}": "{:,.0f}", "Variacion (%)": "{:+.1f}"}, na_rep="s/d"),
+        use_container_width=True, hide_index=True
+    )
+
+    st.divider()
+
+    # --- 2. MES CONTRA MES ANTERIOR Y MISMO MES DEL AÑO PASADO ---
+    st.header("Comparativo Mensual")
+    fecha_ref = comp.fechas[int(np.searchsorted(comp.anios, anio)), semana - 1]
+    fecha_ref = pd.Timestamp(fecha_ref[~np.isnat(fecha_ref)][-1])
+    c_mes, c_anio_mes = st.columns(2)
+    with c_mes:
+        mes = st.selectbox("Mes", range(1, 13), index=fecha_ref.month - 1, format_func=lambda m: MESES[m - 1])
+    with c_anio_mes:
+        anio_mes = st.selectbox("Año", anios, index=anios.index(fecha_ref.year) if fecha_ref.year in anios else len(anios) - 1)
+    with etapa("comparativo.mes"):
+        df_mes = comp.comparar_mes(anio_mes, mes)
+    st.dataframe(
+        df_mes.rename(columns={
+            "linea": "Linea", "promedio": "Promedio Diario", "promedio_mes_anterior": "Mes Anterior", "mom_pct": "MoM (%)",
+            "promedio_anio_anterior": "Mismo Mes Año Anterior", "yoy_pct": "YoY (%)"
+        }).style.format({
+            "Promedio Diario": "{:,.0f}", "Mes Anterior": "{:,.0f}", "Mismo Mes Año Anterior": "{:,.0f}",
+            "MoM (%)": "{:+.1f}", "YoY (%)": "{:+.1f}"
+        }, na_rep="s/d"),
+        use_container_width=True, hide_index=True
+    )
+
+    st.divider()
+
+    # --- 3. MAPA DE CRECIMIENTO ---
+    st.header(f"Crecimiento Semanal {anio} vs. {anio - 1}")
+    with etapa("comparativo.crecimiento"):
+        df_crec = comp.crecimiento(anio, excluir_festivos=excluir).dropna(axis=1, how="all")
+        limite = float(np.nanpercentile(np.abs(df_crec.to_numpy()), 95)) if df_crec.notna().any().any() else 1.0
+        fig_heat = px.imshow(
+            df_crec, aspect="auto", color_continuous_scale="RdYlGn", zmin=-limite, zmax=limite,
+            labels={"x": "Semana ISO", "y": "", "color": "YoY (%)"}
+        )
+        fig_heat.add_vline(x=semana, line_dash="dash", line_color="black")
+        fig_heat.update_layout(template="plotly_white")
+        st.plotly_chart(fig_heat, use_container_width=True)
+
+    st.divider()
+
+    # --- 4. CURVAS DE RECUPERACION ---
+    st.header("Curvas de Recuperacion")
+    st.markdown("Total de cada semana completa como porcentaje de la misma semana ISO del año base (media movil de 4 semanas).")
+    anios_base = [int(a) for a in comp.anios]
+    anio_base = st.selectbox("Año Base (= 100)", anios_base, index=min(1, len(anios_base) - 1))
+    with etapa("comparativo.recuperacion"):
+        df_rec = comp.recuperacion(anio_base)
+        fig_rec = px.line(df_rec, x="fecha", y="indice", color="linea", color_discrete_map=colores,
+                          labels={"indice": f"Indice ({anio_base} = 100)", "fecha": "", "linea": "Linea"})
+        fig_rec.add_hline(y=100, line_dash="dot", line_color="grey")
+        fig_rec.update_layout(template="plotly_white", legend=dict(orientation="h", y=1.1))
+        st.plotly_chart(fig_rec, use_container_width=True)
@@ -1,49 +1,42 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-from utils import cargar_datos
+from plotly.subplots import make_subplots
+from motor.correlacion import (
+    FEATURES_COLS, VENTANA_MOVIL, calcular_pivot, calcular_correlacion, calcular_regresiones,
+    calcular_correlacion_movil, calcular_caracteristicas, barrido_k, curva_k,
+    calcular_perfiles, barrido_perfiles
+)
+from motor.estadisticas import DIAS_SEMANA
+from motor.perfilado import cronometrar, etapa
+from utils import MESES, version_datos
 
-def show_correlacion():
-    # --- SE ELIMINÓ EL BLOQUE DE ESTILOS CSS QUE CAUSABA EL FONDO BLANCO ---
-
-    st.title("Correlacion y Agrupamiento")
-    st.markdown("""
-    Este modulo analiza la relacion entre lineas y las agrupa segun su comportamiento estadistico.
-    """)
-
-    try:
-        df = cargar_datos()
-    except Exception as e:
-        st.error(f"Error cargando datos: {e}")
-        return
+# --- SECCIONES ---
+# Cada seccion recibe solo la version del dataset y lee sus calculos de cache.
+# La comparativa, la correlacion movil y la segmentacion son fragmentos: sus widgets solo re-ejecutan su propia seccion.
 
-    # ==============================================================================
-    # 1. ANALISIS DE CORRELACION (PEARSON)
-    # ==============================================================================
-    st.header("Matriz de Correlacion")
-    st.markdown("Analisis de la relacion lineal entre las diferentes lineas.")
+def seccion_heatmap(version):
+    with etapa("correlacion.heatmap.datos"):
+        corr_matrix = calcular_correlacion(version)
+    
+    with etapa("correlacion.heatmap.grafica"):
+        fig_heat = px.imshow(
+            corr_matrix,
+            text_auto=".2f",
+            aspect="auto",
+            color_continuous_scale="RdBu_r", # Escala Rojo-Azul
+            origin="lower",
+            title="Mapa de Calor de Correlaciones (Pearson)"
+        )
+        st.plotly_chart(fig_heat, use_container_width=True)
 
-    # Pivoteamos: Filas=Fechas, Columnas=Lineas
-    df_pivot = df.pivot_table(index="fecha", columns="linea", values="afluencia", aggfunc="sum").fillna(0)
 
-    # --- MAPA DE CALOR (HEATMAP) ---
-    corr_matrix = df_pivot.corr(method='pearson')
-    
-    fig_heat = px.imshow(
-        corr_matrix,
-        text_auto=".2f",
-        aspect="auto",
-        color_continuous_scale="RdBu_r", # Escala Rojo-Azul
-        origin="lower",
-        title="Mapa de Calor de Correlaciones (Pearson)"
-    )
-    st.plotly_chart(fig_heat, use_container_width=True)
+@st.fragment
+@cronometrar("correlacion.dispersion")
+def seccion_dispersion(version):
+    df_pivot = calcular_pivot(version)
 
-    # --- COMPARATIVA DIRECTA (SCATTER) ---
     st.subheader("Comparativa Directa")
     col1, col2 = st.columns(2)
     with col1:
@@ -51,61 +44,161 @@ def show_correlacion():
     with col2:
         y_axis = st.selectbox("Eje Y", df_pivot.columns, index=1)
         
-    fig_scatter = px.scatter(
-        df_pivot, x=x_axis, y=y_axis, 
-        trendline="ols",
-        opacity=0.5,
-        title=f"Dispersion: {x_axis} vs {y_axis}"
-    )
-    fig_scatter.update_traces(marker=dict(size=6, color="#2980b9"), line=dict(color="red"))
-    st.plotly_chart(fig_scatter, use_container_width=True)
+    # Pendiente/intercepto/R² de todos los pares ya estan en cache: cambiar de par no ajusta ningun modelo
+    reg = calcular_regresiones(version)
+    pendiente, intercepto = reg["pendiente"].loc[x_axis, y_axis], reg["intercepto"].loc[x_axis, y_axis]
+    r, r2 = reg["r"].loc[x_axis, y_axis], reg["r2"].loc[x_axis, y_axis]
+
+    with etapa("correlacion.dispersion.grafica"):
+        fig_scatter = px.scatter(
+            df_pivot, x=x_axis, y=y_axis, 
+            opacity=0.5,
+            title=f"Dispersion: {x_axis} vs {y_axis}"
+        )
+        fig_scatter.update_traces(marker=dict(size=6, color="#2980b9"))
+        # Recta de minimos cuadrados: basta con sus extremos
+        x_rango = np.array([df_pivot[x_axis].min(), df_pivot[x_axis].max()])
+        fig_scatter.add_scatter(
+            x=x_rango, y=intercepto + pendiente * x_rango,
+            mode="lines", line=dict(color="red"), showlegend=False,
+            hovertemplate=f"{y_axis} = {pendiente:.4f} * {x_axis} + {intercepto:,.1f}<br>R² = {r2:.4f}<extra>OLS</extra>"
+        )
+        st.plotly_chart(fig_scatter, use_container_width=True)
     
-    r2 = df_pivot[x_axis].corr(df_pivot[y_axis])
-    st.info(f"Coeficiente de Correlacion (R): {r2:.4f}")
+    st.info(f"Coeficiente de Correlacion (R): {r:.4f}  |  R²: {r2:.4f}  |  Pendiente: {pendiente:.4f}")
 
-    st.divider()
 
-    # ==============================================================================
-    # 2. PCA CON CLUSTERING (SEGMENTACION)
-    # ==============================================================================
-    st.header("Segmentacion de Lineas (PCA + K-Means)")
-    st.markdown("""
-    Agrupamiento de lineas basado en sus caracteristicas estadisticas (Promedio, Desviacion, Totales).
-    Se utiliza PCA para visualizar los grupos en 2 dimensiones.
-    """)
+@st.fragment
+@cronometrar("correlacion.movil")
+def seccion_correlacion_movil(version):
+    st.subheader("Correlacion Movil")
+    c_ventana, c_fecha = st.columns([1, 2])
+    with c_ventana:
+        ventana = st.select_slider("Ventana (Dias)", options=[30, 60, 90, 180, 365], value=VENTANA_MOVIL)
 
-    # --- PREPARACION DE CARACTERISTICAS (FEATURE ENGINEERING) ---
-    df_features = df.groupby("linea")["afluencia"].agg(
-        promedio_diario="mean",
-        desviacion_estandar="std",
-        total_acumulado="sum",
-        pico_maximo="max"
-    ).reset_index().fillna(0)
-
-    # Escalado de datos (Necesario para PCA y K-Means)
-    features_cols = ["promedio_diario", "desviacion_estandar", "total_acumulado", "pico_maximo"]
-    X = df_features[features_cols]
-    
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    # Una matriz por dia para cada tamaño de ventana; mover la fecha solo indexa el arreglo
+    with etapa("correlacion.movil.datos"):
+        movil = calcular_correlacion_movil(version, ventana)
+    fechas, matrices, lineas = movil["fechas"], movil["matrices"], movil["lineas"]
+    if len(fechas) == 0:
+        st.warning("No hay suficientes dias para esa ventana.")
+        return
 
-    # --- CONFIGURACION K-MEANS ---
-    k_clusters = st.sidebar.slider("Numero de Grupos (K-Means)", min_value=2, max_value=6, value=3)
+    with c_fecha:
+        fecha_sel = st.select_slider("Cierre de la Ventana", options=list(fechas.date), value=fechas[-1].date())
+    i = fechas.searchsorted(pd.Timestamp(fecha_sel))
 
-    # --- MODELADO (CLUSTERING) ---
-    kmeans = KMeans(n_clusters=k_clusters, random_state=42, n_init=10)
-    clusters = kmeans.fit_predict(X_scaled)
-    df_features["Cluster"] = clusters.astype(str)
+    with etapa("correlacion.movil.grafica"):
+        c_mapa, c_serie = st.columns(2)
+        with c_mapa:
+            fig_mov = px.imshow(
+                pd.DataFrame(matrices[i], index=lineas, columns=lineas),
+                text_auto=".2f",
+                aspect="auto",
+                color_continuous_scale="RdBu_r",
+                zmin=-1, zmax=1,
+                origin="lower",
+                title=f"Pearson a {ventana} dias hasta {fecha_sel}"
+            )
+            st.plotly_chart(fig_mov, use_container_width=True)
+        with c_serie:
+            # Acoplamiento promedio: media de las correlaciones fuera de la diagonal
+            fuera = ~np.eye(len(lineas), dtype=bool)
+            acople = np.nanmean(matrices[:, fuera], axis=1) if len(lineas) > 1 else np.full(len(fechas), np.nan)
+            fig_acople = px.line(
+                x=fechas, y=acople,
+                labels={"x": "Cierre de la Ventana", "y": "Correlacion Promedio"},
+                title="Acoplamiento Promedio entre Lineas"
+            )
+            fig_acople.add_vline(x=pd.Timestamp(fecha_sel), line_dash="dash", line_color="grey")
+            st.plotly_chart(fig_acople, use_container_width=True)
 
-    # --- REDUCCION DE DIMENSIONES (PCA) PARA VISUALIZACION ---
-    pca = PCA(n_components=2)
-    components = pca.fit_transform(X_scaled)
-    
-    # Agregamos las coordenadas PCA al dataframe
-    df_features["PC1"] = components[:, 0]
-    df_features["PC2"] = components[:, 1]
-    
-    var_explicada = pca.explained_variance_ratio_.sum() * 100
+
+def grafica_curva_k(barrido, k_sel):
+    df_k = curva_k(barrido)
+    fig_k = make_subplots(specs=[[{"secondary_y": True}]])
+    fig_k.add_scatter(x=df_k["k"], y=df_k["inercia"], name="Inercia", mode="lines+markers")
+    fig_k.add_scatter(x=df_k["k"], y=df_k["silhouette"], name="Silhouette", mode="lines+markers", secondary_y=True)
+    fig_k.add_vline(x=k_sel, line_dash="dash", line_color="grey")
+    fig_k.update_layout(template="plotly_white", xaxis_title="K", legend=dict(orientation="h", y=1.1))
+    fig_k.update_yaxes(title_text="Inercia", secondary_y=False)
+    fig_k.update_yaxes(title_text="Silhouette", secondary_y=True)
+    return fig_k
+
+
+def segmentacion_perfiles(version):
+    # Perfiles dia de la semana x mes + PCA incremental; MiniBatch K-Means para todos los k
+    with etapa("correlacion.perfiles.pca"):
+        df_perfiles, Z, var_explicada = calcular_perfiles(version)
+    with etapa("correlacion.perfiles.modelos"):
+        barrido = barrido_perfiles(version)
+    ks = list(barrido)
+    if not ks:
+        st.warning("Se necesitan al menos 3 lineas para agrupar.")
+        return
+    k_clusters = st.slider("Numero de Grupos (MiniBatch K-Means)", min_value=ks[0], max_value=ks[-1], value=min(3, ks[-1]), key="k_perfiles")
+    clusters, score = barrido[k_clusters]["clusters"].astype(str), barrido[k_clusters]["silhouette"]
+    df_mapa = pd.DataFrame({"linea": df_perfiles.index, "PC1": Z[:, 0], "PC2": Z[:, 1] if Z.shape[1] > 1 else 0.0, "Cluster": clusters})
+
+    c_grafica, c_datos = st.columns([2, 1])
+    with c_grafica:
+        st.subheader("Mapa de Grupos por Perfil (PCA)")
+        with etapa("correlacion.perfiles.grafica"):
+            fig_pca = px.scatter(
+                df_mapa, x="PC1", y="PC2", color="Cluster", text="linea",
+                title=f"Perfiles Semana x Mes (Varianza: {var_explicada:.1f}%)", template="plotly_white"
+            )
+            fig_pca.update_traces(textposition='top center', marker=dict(size=14, opacity=0.8, line=dict(width=1, color='DarkSlateGrey')))
+            st.plotly_chart(fig_pca, use_container_width=True)
+    with c_datos:
+        st.subheader("Metricas y Resumen")
+        st.metric("Calidad Agrupamiento (Silhouette)", f"{score:.3f}")
+        st.dataframe(df_mapa[["linea", "Cluster"]].sort_values(["Cluster", "linea"]), use_container_width=True, hide_index=True)
+
+    # Perfil promedio de cada grupo (1 = nivel promedio de la linea)
+    st.subheader("Perfil Promedio por Grupo")
+    perfil_grupo = df_perfiles.groupby(clusters).mean()
+    semanal = perfil_grupo.T.groupby(level="dia_semana").mean().set_axis(DIAS_SEMANA)
+    mensual = perfil_grupo.T.groupby(level="mes").mean().set_axis(MESES)
+    c_sem, c_mes = st.columns(2)
+    with c_sem:
+        fig_sem = px.line(semanal, markers=True, labels={"index": "", "value": "Nivel Relativo", "variable": "Cluster"}, title="Semana")
+        fig_sem.update_layout(template="plotly_white")
+        st.plotly_chart(fig_sem, use_container_width=True)
+    with c_mes:
+        fig_mes = px.line(mensual, markers=True, labels={"index": "", "value": "Nivel Relativo", "variable": "Cluster"}, title="Año")
+        fig_mes.update_layout(template="plotly_white")
+        st.plotly_chart(fig_mes, use_container_width=True)
+
+    st.subheader("Seleccion de K (Codo y Silhouette)")
+    st.plotly_chart(grafica_curva_k(barrido, k_clusters), use_container_width=True)
+
+
+@st.fragment
+@cronometrar("correlacion.segmentacion")
+def seccion_segmentacion(version):
+    base = st.radio("Agrupar por", ["Estadisticas resumen", "Perfil semana x mes"], horizontal=True)
+    if base == "Perfil semana x mes":
+        segmentacion_perfiles(version)
+        return
+
+    # --- PREPARACION DE CARACTERISTICAS (FEATURE ENGINEERING) + PCA ---
+    with etapa("correlacion.segmentacion.pca"):
+        df_features, _, var_explicada = calcular_caracteristicas(version)
+
+    # --- CONFIGURACION K-MEANS ---
+    # Los fragmentos no pueden escribir en la barra lateral: el control vive junto a la grafica
+    # --- MODELADO (CLUSTERING) ---
+    # Todos los k se ajustan de una vez (en paralelo); mover el slider es una consulta al diccionario
+    with etapa("correlacion.segmentacion.modelos"):
+        barrido = barrido_k(version)
+    ks = list(barrido)
+    if not ks:
+        st.warning("Se necesitan al menos 3 lineas para agrupar.")
+        return
+    k_clusters = st.slider("Numero de Grupos (K-Means)", min_value=ks[0], max_value=ks[-1], value=min(3, ks[-1]))
+    clusters, score = barrido[k_clusters]["clusters"], barrido[k_clusters]["silhouette"]
+    df_features = df_features.assign(Cluster=clusters.astype(str))
 
     # --- VISUALIZACION ---
     c_grafica, c_datos = st.columns([2, 1])
@@ -119,7 +212,7 @@ def show_correlacion():
             color="Cluster",
             text="linea",
             size="total_acumulado",
-            hover_data=features_cols,
+            hover_data=FEATURES_COLS,
             title=f"Proyeccion PCA con Clustering K-Means (Varianza: {var_explicada:.1f}%)",
             template="plotly_white"
         )
@@ -130,10 +223,57 @@ def show_correlacion():
         st.subheader("Metricas y Resumen")
         
         # Silhouette Score
-        score = silhouette_score(X_scaled, clusters)
         st.metric("Calidad Agrupamiento (Silhouette)", f"{score:.3f}")
         
         st.markdown("#### Promedios por Grupo")
         # Mostrar caracteristicas promedio de cada cluster
-        resumen = df_features.groupby("Cluster")[features_cols].mean()
+        resumen = df_features.groupby("Cluster")[FEATURES_COLS].mean()
         st.dataframe(resumen.style.highlight_max(axis=0), use_container_width=True)
+
+    # --- CURVA DE CODO Y SILHOUETTE ---
+    st.subheader("Seleccion de K (Codo y Silhouette)")
+    st.plotly_chart(grafica_curva_k(barrido, k_clusters), use_container_width=True)
+
+
+def show_correlacion():
+    # --- SE ELIMINÓ EL BLOQUE DE ESTILOS CSS QUE CAUSABA EL FONDO BLANCO ---
+
+    st.title("Correlacion y Agrupamiento")
+    st.markdown("""
+    Este modulo analiza la relacion entre lineas y las agrupa segun su comportamiento estadistico.
+    """)
+
+    try:
+        version = version_datos()
+    except Exception as e:
+        st.error(f"Error cargando datos: {e}")
+        return
+
+    # ==============================================================================
+    # 1. ANALISIS DE CORRELACION (PEARSON)
+    # ==============================================================================
+    st.header("Matriz de Correlacion")
+    st.markdown("Analisis de la relacion lineal entre las diferentes lineas.")
+
+    # --- MAPA DE CALOR (HEATMAP) ---
+    seccion_heatmap(version)
+
+    # --- COMPARATIVA DIRECTA (SCATTER) ---
+    seccion_dispersion(version)
+
+    # --- CORRELACION EN EL TIEMPO (VENTANAS DESLIZANTES) ---
+    seccion_correlacion_movil(version)
+
+    st.divider()
+
+    # ==============================================================================
+    # 2. PCA CON CLUSTERING (SEGMENTACION)
+    # ==============================================================================
+    st.header("Segmentacion de Lineas (PCA + K-Means)")
+    st.markdown("""
+    Agrupamiento de lineas basado en sus caracteristicas estadisticas (Promedio, Desviacion, Totales)
+    o en la forma de su perfil por dia de la semana y mes, sin importar su volumen.
+    Se utiliza PCA para visualizar los grupos en 2 dimensiones.
+    """)
+
+    seccion_segmentacion(version)
@@ -1,62 +1,33 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import os
 import datetime
-from utils import cargar_datos
-
-# --- RECURSOS Y FUNCIONES ---
-IMAGENES = {
-    "Línea 1": "MB-1.png", "Línea 2": "MB-2.png", "Línea 3": "MB-3.png",
-    "Línea 4": "MB-4.png", "Línea 5": "MB-5.png", "Línea 6": "MB-6.png",
-    "Línea 7": "MB-7.png", "Emergente": "ícono-MB.png"
-}
-
-COLOR_MAP = {
-    'Línea 1': '#B5261E', 'Línea 2': '#6A1B9A', 'Línea 3': '#7CB342',
-    'Línea 4': '#EF6C00', 'Línea 5': '#0288D1', 'Línea 6': '#D81B60',
-    'Línea 7': '#2E7D32', 'Emergente': '#616161'
-}
-
-def get_img_path(filename):
-    # Ajuste de ruta: estamos en /views, hay que subir un nivel
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    root_dir = os.path.dirname(current_dir)
-    paths = [
-        os.path.join(root_dir, "imagenes", filename),
-        os.path.join(root_dir, filename)
-    ]
-    for p in paths:
-        if os.path.exists(p): return p
-    return None
-
-def normalizar_linea(texto):
-    if not isinstance(texto, str): return str(texto)
-    t = texto.strip().title()
-    if "Linea" in t and "Línea" not in t: t = t.replace("Linea", "Línea")
-    return t
-
-def render_metrics_centered(df):
-    if df.empty: return
-    dias = df["fecha"].nunique() or 1
-    
+from motor.anomalias import anomalias_por_version, marcas_por_linea, ubicar_marcas
+from motor.cubo import cargar_cubo
+from motor.kpis import cargar_kpis
+from motor.muestreo import ANCHO_PAGINA_PX, reducir_matriz
+from motor.perfilado import etapa
+from utils import cargar_dim_lineas, icono, version_datos, ICONO_SISTEMA
+
+
+def render_metrics_centered(kpis, dim, lineas, ini, fin):
+    # Totales y dias salen de las sumas acumuladas de la tabla de KPIs: O(1) por linea
+    sistema = kpis.sistema(lineas, ini, fin)
+    if sistema["dias"] == 0: return
+
     items = []
     # Sistema
-    val_sys = df["afluencia"].sum() / dias
-    items.append({"label": "Sistema Total", "val": val_sys, "img": "ícono-MB.png", "color": "#333"})
-    
-    # Líneas
-    df_l = df.groupby("linea")["afluencia"].sum().reset_index()
-    df_l["promedio"] = df_l["afluencia"] / dias
-    df_l = df_l.sort_values("linea")
-    
-    for _, row in df_l.iterrows():
-        nombre = normalizar_linea(row["linea"])
+    items.append({"label": "Sistema Total", "val": sistema["promedio"], "img": icono(ICONO_SISTEMA), "color": "#333"})
+
+    df_l = kpis.por_linea(lineas, ini, fin)
+    df_l = df_l[df_l["dias"] > 0].sort_values("linea").merge(dim, on="linea")
+
+    for fila in df_l.itertuples():
         items.append({
-            "label": nombre.replace("Línea ", "L"), 
-            "val": row["promedio"],
-            "img": IMAGENES.get(nombre, "ícono-MB.png"),
-            "color": COLOR_MAP.get(nombre, "#555")
+            "label": fila.etiqueta,
+            "val": fila.promedio,
+            "img": icono(fila.imagen),
+            "color": fila.color
         })
 
     MAX_COLS = 9 
@@ -70,9 +41,8 @@ def render_metrics_centered(df):
         item = items[i]
         
         with cols[grid_col_idx]:
-            path = get_img_path(item["img"])
-            if path:
-                st.image(path, width=50)
+            if item["img"] is not None:
+                st.image(item["img"], width=50)
             else:
                 st.markdown(f'<div style="background:{item["color"]};width:40px;height:40px;border-radius:50%;margin:0 auto 5px auto;"></div>', unsafe_allow_html=True)
             
@@ -97,71 +67,96 @@ def show_home():
     st.title("Tablero General de Afluencia")
 
     try:
-        df = cargar_datos()
+        with etapa("home.carga"):
+            cubo = cargar_cubo()
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
         return
 
-    if 'linea' in df.columns: df['linea'] = df['linea'].apply(normalizar_linea)
-
     # --- FILTROS ---
     st.sidebar.header("Filtros")
     MIN_FECHA, MAX_FECHA = datetime.date(2021, 1, 1), datetime.date(2025, 11, 30)
     
-    default_start = max(df["fecha"].min().date(), MIN_FECHA)
-    default_end = min(df["fecha"].max().date(), MAX_FECHA)
+    min_csv, max_csv = cubo.rango_fechas()
+    default_start = max(min_csv, MIN_FECHA)
+    default_end = min(max_csv, MAX_FECHA)
     
     ini = st.sidebar.date_input("Fecha Inicio", value=default_start, min_value=MIN_FECHA, max_value=MAX_FECHA)
     fin = st.sidebar.date_input("Fecha Fin", value=default_end, min_value=MIN_FECHA, max_value=MAX_FECHA)
     st.sidebar.divider()
 
     st.sidebar.subheader("Líneas a visualizar")
+    dim = cargar_dim_lineas()
+    colores = dict(zip(dim["linea"], dim["color"]))
     sel_lines = []
-    for linea in sorted(df["linea"].unique()):
+    for linea in dim["linea"]:
         if st.sidebar.checkbox(linea, value=True, key=f"home_{linea}"):
             sel_lines.append(linea)
             
+    st.sidebar.divider()
+    marcar = st.sidebar.checkbox("Marcar días atípicos", value=True, key="home_anomalias")
+
     if not sel_lines:
         st.warning("Selecciona al menos una línea.")
         return
 
-    mask = (df["fecha"].dt.date >= ini) & (df["fecha"].dt.date <= fin) & (df["linea"].isin(sel_lines))
-    df_f = df.loc[mask]
-
-    if df_f.empty:
+    with etapa("home.filtros"):
+        hay_datos = cubo.dias_con_datos(sel_lines, ini, fin) > 0
+    if not hay_datos:
         st.warning("Sin datos.")
         return
 
     # --- CONTENIDO ---
     st.markdown("###")
-    render_metrics_centered(df_f)
+    with etapa("home.kpis"):
+        render_metrics_centered(cargar_kpis(), dim, sel_lines, ini, fin)
     st.markdown("---")
 
     c1, c2 = st.columns([2, 1])
     with c1:
         st.subheader("Tendencia de Afluencia")
-        df_t = df_f.groupby(["fecha", "linea"])["afluencia"].sum().reset_index()
-        fig1 = px.line(df_t, x="fecha", y="afluencia", color="linea", color_discrete_map=COLOR_MAP)
-        fig1.update_layout(template="plotly_white", xaxis_title="", yaxis_title="Pasajeros", legend=dict(orientation="h", y=1.1))
-        st.plotly_chart(fig1, use_container_width=True)
+        # Todas las trazas se reducen juntas con LTTB; en rangos cortos se grafica a resolucion completa
+        with etapa("home.tendencia.datos"):
+            df_m = cubo.matriz_lineas(sel_lines, ini, fin)
+            df_t = reducir_matriz(df_m, ANCHO_PAGINA_PX * 2 // 3)  # columna de 2/3
+        with etapa("home.tendencia.grafica"):
+            fig1 = px.line(df_t, x="fecha", y="afluencia", color="linea", color_discrete_map=colores)
+            if marcar:
+                # Los dias atipicos se ubican sobre la serie completa (la reduccion LTTB puede omitirlos)
+                with etapa("home.tendencia.anomalias"):
+                    marcas = ubicar_marcas(marcas_por_linea(anomalias_por_version(version_datos()), sel_lines, ini, fin), df_m)
+                fig1.add_scatter(
+                    x=marcas["fecha"], y=marcas["afluencia"], mode="markers", name="Atípico",
+                    marker=dict(symbol="x", size=8, color="#c0392b"),
+                    customdata=marcas[["linea", "tipos_pago", "z"]],
+                    hovertemplate="%{customdata[0]} · %{x|%Y-%m-%d}<br>%{customdata[1]} (z = %{customdata[2]:.1f})<extra></extra>"
+                )
+            fig1.update_layout(template="plotly_white", xaxis_title="", yaxis_title="Pasajeros", legend=dict(orientation="h", y=1.1))
+            st.plotly_chart(fig1, use_container_width=True)
 
     with c2:
         st.subheader("Distribución por Línea")
-        df_p = df_f.groupby("linea")["afluencia"].sum().reset_index()
-        fig2 = px.pie(df_p, values="afluencia", names="linea", color="linea", color_discrete_map=COLOR_MAP, hole=0.6)
-        fig2.update_layout(template="plotly_white", showlegend=False, margin=dict(t=20, b=20, l=20, r=20))
-        fig2.update_traces(textposition='inside', textinfo='percent+label')
-        st.plotly_chart(fig2, use_container_width=True)
+        with etapa("home.distribucion.datos"):
+            df_p = cubo.total_por_linea(sel_lines, ini, fin)
+        with etapa("home.distribucion.grafica"):
+            fig2 = px.pie(df_p, values="afluencia", names="linea", color="linea", color_discrete_map=colores, hole=0.6)
+            fig2.update_layout(template="plotly_white", showlegend=False, margin=dict(t=20, b=20, l=20, r=20))
+            fig2.update_traces(textposition='inside', textinfo='percent+label')
+            st.plotly_chart(fig2, use_container_width=True)
 
     st.markdown("---")
     st.subheader("Análisis por Tipo de Pago")
-    if "tipo_pago" in df_f.columns:
+    if cubo.tipos_pago:
         cp1, cp2 = st.columns(2)
         with cp1:
-            df_pay = df_f.groupby("tipo_pago")["afluencia"].sum().reset_index()
-            fig_pie = px.pie(df_pay, values="afluencia", names="tipo_pago", hole=0.4, color_discrete_sequence=px.colors.qualitative.Pastel)
-            st.plotly_chart(fig_pie, use_container_width=True)
+            with etapa("home.pagos.datos"):
+                df_pay = cubo.total_por_pago(sel_lines, ini, fin)
+            with etapa("home.pagos.grafica"):
+                fig_pie = px.pie(df_pay, values="afluencia", names="tipo_pago", hole=0.4, color_discrete_sequence=px.colors.qualitative.Pastel)
+                st.plotly_chart(fig_pie, use_container_width=True)
         with cp2:
-            df_bar = df_f.groupby(["linea", "tipo_pago"])["afluencia"].sum().reset_index()
-            fig_bar = px.bar(df_bar, x="linea", y="afluencia", color="tipo_pago", barmode="stack", color_discrete_sequence=px.colors.qualitative.Pastel)
-            st.plotly_chart(fig_bar, use_container_width=True)
+            with etapa("home.pagos_linea.datos"):
+                df_bar = cubo.linea_por_pago(sel_lines, ini, fin)
+            with etapa("home.pagos_linea.grafica"):
+                fig_bar = px.bar(df_bar, x="linea", y="afluencia", color="tipo_pago", barmode="stack", color_discrete_sequence=px.colors.qualitative.Pastel)
+                st.plotly_chart(fig_bar, use_container_width=True)
@@ -1,53 +1,27 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import os
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import datetime
-from utils import cargar_datos
-
-# --- RECURSOS ---
-IMAGENES = {
-    "Línea 1": "MB-1.png", "Línea 2": "MB-2.png", "Línea 3": "MB-3.png",
-    "Línea 4": "MB-4.png", "Línea 5": "MB-5.png", "Línea 6": "MB-6.png",
-    "Línea 7": "MB-7.png", "Emergente": "ícono-MB.png"
-}
-COLOR_MAP = {
-    'Línea 1': '#B5261E', 'Línea 2': '#6A1B9A', 'Línea 3': '#7CB342',
-    'Línea 4': '#EF6C00', 'Línea 5': '#0288D1', 'Línea 6': '#D81B60',
-    'Línea 7': '#2E7D32', 'Emergente': '#616161'
-}
-
-def get_img_path(filename):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    root_dir = os.path.dirname(current_dir)
-    paths = [
-        os.path.join(root_dir, "imagenes", filename),
-        os.path.join(root_dir, filename)
-    ]
-    for p in paths:
-        if os.path.exists(p): return p
-    return None
-
-def normalizar_linea(texto):
-    if not isinstance(texto, str): return str(texto)
-    t = texto.strip().title()
-    if "Linea" in t and "Línea" not in t: t = t.replace("Linea", "Línea")
-    return t
-
-def render_line_metrics(df, linea_sel):
-    dias = df["fecha"].nunique() or 1
-    total = df["afluencia"].sum()
-    promedio = total / dias
-    maximo = df["afluencia"].max()
-    
-    nombre_norm = normalizar_linea(linea_sel)
-    img_file = IMAGENES.get(nombre_norm, "ícono-MB.png")
-    path = get_img_path(img_file)
+from motor.anomalias import anomalias_por_version, marcas_por_linea, ubicar_marcas
+from motor.consultas import cargar_indice
+from motor.cubo import cargar_cubo
+from motor.muestreo import ANCHO_PAGINA_PX, reducir_serie
+from motor.perfilado import etapa
+from motor.estadisticas import DIAS_SEMANA, dia_semana, histograma, resumen_caja
+from motor.kpis import cargar_kpis
+from utils import cargar_dim_lineas, icono, version_datos
+
+
+def render_line_metrics(kpis, linea_sel, imagen):
+    total, promedio, maximo = kpis["total"], kpis["promedio"], kpis["maximo"]
+    img = icono(imagen)
     
     c_img, c_kpi1, c_kpi2, c_kpi3 = st.columns([1, 1, 1, 1])
     
     with c_img:
-        if path: st.image(path, width=70)
+        if img is not None: st.image(img, width=70)
         else: st.markdown(f"**{linea_sel}**")
         
     with c_kpi1:
@@ -55,7 +29,26 @@ def render_line_metrics(df, linea_sel):
     with c_kpi2:
         st.markdown(f'<div class="metric-value">{promedio:,.0f}</div><div class="metric-label">Promedio Diario</div>', unsafe_allow_html=True)
     with c_kpi3:
-        st.markdown(f'<div class="metric-value">{maximo:,.0f}</div><div class="metric-label">Pico Maximo</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-value">{maximo:,.0f}</div><div class="metric-label">Pico Diario</div>', unsafe_allow_html=True)
+
+def trazas_caja(resumen, atipicos, nombres, colores, horizontal=False):
+    # Cajas a partir de estadisticas precalculadas + los atipicos como puntos sueltos
+    trazas = []
+    for i, fila in enumerate(resumen.itertuples()):
+        nombre, color = nombres[fila.grupo], colores[i % len(colores)]
+        stats = dict(
+            q1=[fila.q1], median=[fila.mediana], q3=[fila.q3], mean=[fila.media],
+            lowerfence=[fila.bigote_inf], upperfence=[fila.bigote_sup], name=nombre,
+            marker_color=color, orientation="h" if horizontal else "v"
+        )
+        stats["y" if horizontal else "x"] = [nombre]
+        trazas.append(go.Box(**stats))
+
+        puntos = atipicos.loc[atipicos["grupo"] == fila.grupo, "valor"].to_numpy()
+        if len(puntos):
+            eje = {"x": puntos, "y": [nombre] * len(puntos)} if horizontal else {"x": [nombre] * len(puntos), "y": puntos}
+            trazas.append(go.Scatter(mode="markers", marker=dict(color=color, size=4), name=nombre, **eje))
+    return trazas
 
 # --- FUNCIÓN PRINCIPAL DE LA VISTA ---
 def show_lineas():
@@ -71,30 +64,29 @@ def show_lineas():
     st.title("Analisis Detallado por Linea")
 
     try:
-        df = cargar_datos()
+        with etapa("lineas.carga"):
+            indice = cargar_indice()
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
         return
 
-    if 'linea' in df.columns: df['linea'] = df['linea'].apply(normalizar_linea)
-
     # --- FILTROS ---
     st.sidebar.header("Configuracion")
     
-    lineas = sorted(df["linea"].unique())
-    linea_sel = st.sidebar.selectbox("Selecciona una Linea", lineas)
+    dim = cargar_dim_lineas().set_index("linea")
+    linea_sel = st.sidebar.selectbox("Selecciona una Linea", dim.index.tolist())
     
     MIN_FECHA = datetime.date(2021, 1, 1)
     MAX_FECHA = datetime.date(2025, 11, 30)
     
-    min_csv = df["fecha"].min().date()
-    max_csv = df["fecha"].max().date()
+    min_csv, max_csv = indice.rango_fechas()
     
     ini = st.sidebar.date_input("Inicio", min_csv, min_value=MIN_FECHA, max_value=MAX_FECHA)
     fin = st.sidebar.date_input("Fin", max_csv, min_value=MIN_FECHA, max_value=MAX_FECHA)
+    marcar = st.sidebar.checkbox("Marcar dias atipicos", value=True)
     
-    mask = (df["linea"] == linea_sel) & (df["fecha"].dt.date >= ini) & (df["fecha"].dt.date <= fin)
-    df_linea = df.loc[mask]
+    with etapa("lineas.filtros"):
+        df_linea = indice.query([linea_sel], ini, fin)
 
     if df_linea.empty:
         st.warning(f"No hay datos para {linea_sel} en las fechas seleccionadas.")
@@ -102,16 +94,31 @@ def show_lineas():
 
     # --- CONTENIDO ---
     st.markdown("###")
-    render_line_metrics(df_linea, linea_sel)
+    with etapa("lineas.kpis"):
+        render_line_metrics(cargar_kpis().por_linea([linea_sel], ini, fin).iloc[0], linea_sel, dim.at[linea_sel, "imagen"])
     st.markdown("---")
 
-    color_linea = COLOR_MAP.get(normalizar_linea(linea_sel), "#333")
+    color_linea = dim.at[linea_sel, "color"]
 
     # 1. EVOLUCIÓN TEMPORAL
     st.subheader("Evolucion de Afluencia")
-    fig_time = px.area(df_linea.groupby("fecha")["afluencia"].sum().reset_index(), x="fecha", y="afluencia")
-    fig_time.update_traces(line_color=color_linea, fillcolor=color_linea)
-    st.plotly_chart(fig_time, use_container_width=True)
+    with etapa("lineas.evolucion.datos"):
+        df_dia = cargar_cubo().serie_diaria([linea_sel], ini, fin)
+        df_time = reducir_serie(df_dia, ANCHO_PAGINA_PX)
+    with etapa("lineas.evolucion.grafica"):
+        fig_time = px.area(df_time, x="fecha", y="afluencia")
+        fig_time.update_traces(line_color=color_linea, fillcolor=color_linea)
+        if marcar:
+            with etapa("lineas.evolucion.anomalias"):
+                marcas = marcas_por_linea(anomalias_por_version(version_datos()), [linea_sel], ini, fin)
+                marcas = ubicar_marcas(marcas, df_dia.set_index("fecha")[["afluencia"]].set_axis([linea_sel], axis=1))
+            fig_time.add_scatter(
+                x=marcas["fecha"], y=marcas["afluencia"], mode="markers", name="Atipico", showlegend=False,
+                marker=dict(symbol="x", size=9, color="#c0392b"),
+                customdata=marcas[["tipos_pago", "z"]],
+                hovertemplate="%{x|%Y-%m-%d}: %{y:,.0f}<br>%{customdata[0]} (z = %{customdata[1]:.1f})<extra></extra>"
+            )
+        st.plotly_chart(fig_time, use_container_width=True)
 
     st.markdown("---")
     
@@ -119,56 +126,51 @@ def show_lineas():
     st.subheader("Distribucion de Frecuencias")
     st.markdown("Permite observar como se comportan los volumenes de pasajeros (Histograma).")
     
-    fig_hist = px.histogram(
-        df_linea, 
-        x="afluencia", 
-        nbins=40, 
-        marginal="box", # Boxplot marginal superior
-        title=f"Histograma de Afluencia - {linea_sel}",
-        color_discrete_sequence=[color_linea],
-        opacity=0.75
-    )
-    fig_hist.update_layout(
-        template="plotly_white", 
-        xaxis_title="Cantidad de Pasajeros", 
-        yaxis_title="Frecuencia (Dias)",
-        showlegend=False
-    )
-    st.plotly_chart(fig_hist, use_container_width=True)
+    # Bins, cuartiles y atipicos se calculan en el servidor; solo viajan los resumenes
+    with etapa("lineas.distribucion.datos"):
+        valores = df_linea["afluencia"].to_numpy()
+        df_hist = histograma(valores, nbins=40)
+        caja_total, atipicos_total = resumen_caja(valores)
+
+    with etapa("lineas.distribucion.grafica"):
+        fig_hist = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.03)
+        for traza in trazas_caja(caja_total, atipicos_total, [linea_sel], [color_linea], horizontal=True):
+            fig_hist.add_trace(traza, row=1, col=1)  # Boxplot marginal superior
+        fig_hist.add_bar(
+            x=df_hist["centro"], y=df_hist["conteo"], width=df_hist["fin"] - df_hist["inicio"],
+            marker_color=color_linea, opacity=0.75, row=2, col=1
+        )
+        fig_hist.update_yaxes(showticklabels=False, row=1, col=1)
+        fig_hist.update_layout(
+            template="plotly_white", 
+            title=f"Histograma de Afluencia - {linea_sel}",
+            bargap=0,
+            showlegend=False
+        )
+        fig_hist.update_xaxes(title_text="Cantidad de Pasajeros", row=2, col=1)
+        fig_hist.update_yaxes(title_text="Frecuencia (Dias)", row=2, col=1)
+        st.plotly_chart(fig_hist, use_container_width=True)
 
     # 3. DISPERSIÓN
     st.markdown("---")
     st.subheader("Dispersion y Variabilidad")
     
-    # Preparamos datos para el boxplot (Día de la semana)
-    df_box = df_linea.copy()
-    df_box["dia_num"] = df_box["fecha"].dt.dayofweek
-    dias_map = {0:"Lunes", 1:"Martes", 2:"Miercoles", 3:"Jueves", 4:"Viernes", 5:"Sabado", 6:"Domingo"}
-    df_box["dia_semana"] = df_box["dia_num"].map(dias_map)
-    df_box = df_box.sort_values("dia_num")
+    # Resumen por dia de la semana (una sola pasada agrupada)
+    with etapa("lineas.dispersion.datos"):
+        caja_dias, atipicos_dias = resumen_caja(valores, dia_semana(df_linea["fecha"].to_numpy()), n_grupos=7)
 
     col_box1, col_box2 = st.columns([3, 1])
 
     with col_box1:
         st.markdown("**Variabilidad por Dia de la Semana**")
-        fig_box = px.box(
-            df_box, 
-            x="dia_semana", 
-            y="afluencia", 
-            color="dia_semana",
-            color_discrete_sequence=px.colors.qualitative.Pastel,
-            points="outliers" 
-        )
-        fig_box.update_layout(template="plotly_white", xaxis_title="", yaxis_title="Afluencia", showlegend=False)
-        st.plotly_chart(fig_box, use_container_width=True)
+        with etapa("lineas.dispersion.grafica"):
+            fig_box = go.Figure(trazas_caja(caja_dias, atipicos_dias, DIAS_SEMANA, px.colors.qualitative.Pastel))
+            fig_box.update_layout(template="plotly_white", xaxis_title="", yaxis_title="Afluencia", showlegend=False)
+            st.plotly_chart(fig_box, use_container_width=True)
 
     with col_box2:
         st.markdown("**Dispersion Total**")
-        fig_box_total = px.box(
-            df_box, 
-            y="afluencia",
-            points="all", 
-            color_discrete_sequence=[color_linea]
-        )
-        fig_box_total.update_layout(template="plotly_white", xaxis_title="Periodo", yaxis_title="", showlegend=False)
-        st.plotly_chart(fig_box_total, use_container_width=True)
+        with etapa("lineas.dispersion_total.grafica"):
+            fig_box_total = go.Figure(trazas_caja(caja_total, atipicos_total, ["Total"], [color_linea]))
+            fig_box_total.update_layout(template="plotly_white", xaxis_title="Periodo", yaxis_title="", showlegend=False)
+            st.plotly_chart(fig_box_total, use_container_width=True)
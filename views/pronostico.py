@@ -0,0 +1,120 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from motor.pronostico import HORIZONTE, calcular_modelos, calcular_backtest, predecir
+from motor.perfilado import etapa
+from utils import cargar_dim_lineas, version_datos
+
+DIAS_HISTORIA = 180
+
+
+def show_backtest(version, horizonte, colores):
+    st.subheader(f"Backtest: ultimos {horizonte} dias")
+    st.markdown("Los modelos se ajustan sin el periodo final y su pronostico se compara con lo observado.")
+
+    with etapa("pronostico.backtest.datos"):
+        bt = calcular_backtest(version, horizonte)
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Error Global (WAPE)", f"{bt['wape_global_pct']:.1f}%")
+    c2.metric("Series Ajustadas", f"{bt['series']:,}")
+    c3.metric("Velocidad de Ajuste", f"{bt['series_por_s']:,.0f} series/s", help=f"{bt['segundos_ajuste'] * 1000:,.1f} ms en total")
+
+    with etapa("pronostico.backtest.grafica"):
+        fig_err = px.bar(
+            bt["por_linea"], x="linea", y="wape_pct", color="linea",
+            color_discrete_map=colores,
+            labels={"wape_pct": "WAPE (%)", "linea": "Linea"},
+            title="Error del Pronostico por Linea"
+        )
+        fig_err.update_layout(showlegend=False, template="plotly_white")
+        st.plotly_chart(fig_err, use_container_width=True)
+
+    st.dataframe(
+        bt["por_serie"][["linea", "tipo_pago", "dias", "real", "error_abs", "wape_pct"]]
+        .rename(columns={"dias": "Dias", "real": "Afluencia Real", "error_abs": "Error Absoluto", "wape_pct": "WAPE (%)"}),
+        use_container_width=True, hide_index=True
+    )
+
+
+def show_pronostico():
+    st.title("Pronostico de Afluencia")
+    st.markdown("""
+    Pronostico de corto plazo para cada linea y tipo de pago, con ciclos **semanal** y **quincenal**
+    (los que detecta el analisis de Fourier) y efecto de dias festivos.
+    """)
+
+    try:
+        version = version_datos()
+        with etapa("pronostico.modelos"):
+            datos = calcular_modelos(version)
+    except Exception as e:
+        st.error(f"Error cargando datos: {e}")
+        return
+    dim = cargar_dim_lineas()
+    colores = dict(zip(dim["linea"], dim["color"]))
+
+    # --- FILTROS ---
+    st.sidebar.header("Configuracion")
+    modo = st.sidebar.radio("Modo", ["Pronostico", "Backtest"])
+    horizonte = st.sidebar.slider("Horizonte (Dias)", min_value=7, max_value=90, value=HORIZONTE, step=7)
+
+    if modo == "Backtest":
+        show_backtest(version, horizonte, colores)
+        return
+
+    claves = datos["claves"]
+    lineas = list(dict.fromkeys(claves["linea"]))
+    linea_sel = st.sidebar.selectbox("Linea", lineas)
+    pagos = claves.loc[claves["linea"] == linea_sel, "tipo_pago"].tolist()
+    pagos_sel = st.sidebar.multiselect("Tipos de Pago", pagos, default=pagos)
+    if not pagos_sel:
+        st.warning("Selecciona al menos un tipo de pago.")
+        return
+
+    # Los modelos ya estan ajustados: cambiar linea, pagos u horizonte solo recalcula el producto X @ B
+    with etapa("pronostico.prediccion"):
+        futuros, media, bajo, alto = predecir(datos["modelos"], horizonte)
+    cols = np.flatnonzero((claves["linea"] == linea_sel) & claves["tipo_pago"].isin(pagos_sel))
+
+    # --- 1. HISTORIA RECIENTE + PRONOSTICO ---
+    st.subheader(f"{linea_sel}: proximos {horizonte} dias")
+    with etapa("pronostico.grafica"):
+        dias = datos["dias"][-DIAS_HISTORIA:]
+        hay = datos["M"][-DIAS_HISTORIA:, cols].any(axis=1)
+        historia = datos["Y"][-DIAS_HISTORIA:, cols].sum(axis=1)
+        a_fecha = lambda d: pd.to_datetime(np.asarray(d).astype("datetime64[D]"))
+        fechas_f = a_fecha(futuros)
+
+        fig = go.Figure()
+        fig.add_scatter(x=a_fecha(dias[hay]), y=historia[hay], name="Observado", mode="lines",
+                        line=dict(color=colores.get(linea_sel, "#2980b9")))
+        # Banda aproximada: suma de los limites de cada tipo de pago
+        fig.add_scatter(x=fechas_f, y=alto[:, cols].sum(axis=1), mode="lines", line=dict(width=0), showlegend=False, hoverinfo="skip")
+        fig.add_scatter(x=fechas_f, y=bajo[:, cols].sum(axis=1), mode="lines", line=dict(width=0), fill="tonexty",
+                        fillcolor="rgba(231, 76, 60, 0.2)", name="Intervalo 95%")
+        fig.add_scatter(x=fechas_f, y=media[:, cols].sum(axis=1), name="Pronostico", mode="lines",
+                        line=dict(color="#e74c3c", dash="dash"))
+        fig.update_layout(template="plotly_white", xaxis_title="Fecha", yaxis_title="Afluencia",
+                          legend=dict(orientation="h", y=1.1))
+        st.plotly_chart(fig, use_container_width=True)
+
+    # --- 2. TOTALES PRONOSTICADOS POR LINEA ---
+    st.subheader("Afluencia Pronosticada por Linea")
+    df_tot = claves.assign(afluencia=media.sum(axis=0))
+    df_tot = df_tot.groupby("linea", sort=False)["afluencia"].sum().reset_index()
+    df_tot["promedio_diario"] = df_tot["afluencia"] / horizonte
+    c_graf, c_tabla = st.columns([2, 1])
+    with c_graf:
+        fig_tot = px.bar(df_tot, x="linea", y="afluencia", color="linea", color_discrete_map=colores,
+                         title=f"Total de los proximos {horizonte} dias", labels={"afluencia": "Afluencia", "linea": "Linea"})
+        fig_tot.update_layout(showlegend=False, template="plotly_white")
+        st.plotly_chart(fig_tot, use_container_width=True)
+    with c_tabla:
+        st.dataframe(
+            df_tot.rename(columns={"linea": "Linea", "afluencia": "Total", "promedio_diario": "Promedio Diario"})
+            .style.format({"Total": "{:,.0f}", "Promedio Diario": "{:,.0f}"}),
+            use_container_width=True, hide_index=True
+        )
@@ -1,9 +1,50 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
-from scipy.fft import fft, fftfreq
-from utils import cargar_datos
+import plotly.graph_objects as go
+from motor.muestreo import ANCHO_PAGINA_PX, reducir_serie
+from motor.perfilado import etapa
+from motor.espectral import calcular_espectros, calcular_espectrograma, espectro_serie, ciclos_dominantes
+from utils import version_datos
+
+VENTANA_MIN = 14
+
+def show_espectrograma(seleccion, n_dias):
+    # --- ESPECTROGRAMA: espectros por ventanas deslizantes ---
+    st.subheader("Espectrograma (Fourier por Ventanas)")
+    st.markdown("""
+    Una sola FFT sobre todo el periodo mezcla etapas distintas (recuperacion post-pandemia, nuevas lineas).
+    Aqui se calcula el espectro en ventanas deslizantes para ver como cambia la fuerza de cada ciclo en el tiempo.
+    """)
+
+    # La ventana mas larga es la mitad de la serie: siempre caben al menos dos ventanas
+    max_ventana = min(365, n_dias // 2)
+    if max_ventana <= VENTANA_MIN:
+        st.info(f"Se necesitan mas de {2 * (VENTANA_MIN + 1)} dias de datos para el espectrograma.")
+        return
+    ventana = st.sidebar.slider("Ventana (Dias)", min_value=VENTANA_MIN, max_value=max_ventana, value=min(90, max_ventana))
+    paso = st.sidebar.slider("Salto entre Ventanas (Dias)", min_value=1, max_value=60, value=7)
+
+    with etapa("temporal.espectrograma.datos"):
+        sg = calcular_espectrograma(version_datos(), seleccion, ventana, paso)
+
+    # Solo ciclos de 2 a 35 dias (la zona semanal/quincenal/mensual)
+    with etapa("temporal.espectrograma.grafica"):
+        banda = (sg["periodos"] >= 2) & (sg["periodos"] <= 35)
+        fig_sg = go.Figure(go.Heatmap(
+            x=sg["fechas"],
+            y=sg["periodos"][banda],
+            z=sg["magnitud"][:, banda].T,
+            colorscale="Viridis",
+            colorbar=dict(title="Amplitud")
+        ))
+        fig_sg.update_layout(
+            title=f"Espectrograma: {seleccion} (ventana {ventana} dias, salto {paso})",
+            xaxis_title="Centro de la Ventana",
+            yaxis_title="Periodo del Ciclo (Dias)",
+            template="plotly_white"
+        )
+        st.plotly_chart(fig_sg, use_container_width=True)
 
 def show_temporal():
     # Estilos CSS 
@@ -25,70 +66,61 @@ def show_temporal():
     """)
 
     try:
-        df = cargar_datos()
+        with etapa("temporal.carga"):
+            espectros = calcular_espectros(version_datos())
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
         return
 
     # --- FILTROS ---
     st.sidebar.header("Configuracion de Señal")
-    opciones = ["Sistema Total"] + sorted(df["linea"].unique().tolist())
+    opciones = espectros["nombres"]
     seleccion = st.sidebar.selectbox("Seleccionar Serie a Analizar", opciones)
+    modo = st.sidebar.radio("Modo de Analisis", ["Espectro Completo", "Espectrograma (Ventanas)"])
 
-    # Preparar datos (Agrupar por día)
-    if seleccion == "Sistema Total":
-        df_serie = df.groupby("fecha")["afluencia"].sum().reset_index()
-    else:
-        df_serie = df[df["linea"] == seleccion].groupby("fecha")["afluencia"].sum().reset_index()
-
-    # Asegurar frecuencia diaria (rellenar huecos)
-    df_serie = df_serie.set_index("fecha").asfreq("D").fillna(method="ffill").reset_index()
+    # La serie diaria (con huecos rellenados) y su espectro ya estan precalculados para todas las series
+    j = opciones.index(seleccion)
+    df_serie = pd.DataFrame({"fecha": espectros["fechas"], "afluencia": espectros["Y"][:, j]})
 
     # --- 1. VISUALIZACIÓN DE LA SEÑAL ---
     st.subheader(f"Señal en el Tiempo: {seleccion}")
-    fig_time = px.line(df_serie, x="fecha", y="afluencia", title="Serie Temporal Original")
-    st.plotly_chart(fig_time, use_container_width=True)
+    # Rango a visualizar: al acercarse a un periodo corto la grafica vuelve a resolucion completa
+    f_min, f_max = df_serie["fecha"].iloc[0].date(), df_serie["fecha"].iloc[-1].date()
+    rango = st.slider("Rango a Visualizar", min_value=f_min, max_value=f_max, value=(f_min, f_max))
+    lo = df_serie["fecha"].searchsorted(pd.Timestamp(rango[0]))
+    hi = df_serie["fecha"].searchsorted(pd.Timestamp(rango[1]), side="right")
+    with etapa("temporal.senal.datos"):
+        df_vis = reducir_serie(df_serie.iloc[lo:hi], ANCHO_PAGINA_PX)
+    with etapa("temporal.senal.grafica"):
+        fig_time = px.line(df_vis, x="fecha", y="afluencia", title="Serie Temporal Original")
+        st.plotly_chart(fig_time, use_container_width=True)
+    st.caption(f"Mostrando {len(df_vis):,} de {hi - lo:,} puntos")
 
     st.divider()
 
+    if modo == "Espectrograma (Ventanas)":
+        show_espectrograma(seleccion, len(df_serie))
+        return
+
     # --- 2. CÁLCULO DE FOURIER (FFT) ---
     st.subheader("Gráfica de Amplitud Espectral")
-    
-    # Obtener valores de la señal
-    y = df_serie["afluencia"].values
-    n = len(y)
-    
-    # Restar la media para eliminar el componente DC
-    y_detrend = y - np.mean(y)
-    
-    # Aplicar FFT
-    yf = fft(y_detrend)
-    xf = fftfreq(n, 1) # 1 = paso de muestreo (1 día)
-    
-    # Tomar solo la mitad positiva del espectro
-    xf = xf[:n//2]
-    magnitud = 2.0/n * np.abs(yf[0:n//2])
-    
-    # Crear DataFrame de resultados
-    df_fft = pd.DataFrame({"Frecuencia": xf, "Potencia": magnitud})
-    
-    # Calcular el PERIODO (Días = 1 / Frecuencia)
-    df_fft["Periodo (Dias)"] = df_fft["Frecuencia"].apply(lambda x: 1/x if x > 0 else 0)
-    
-    # Filtramos ruido (Frecuencias muy bajas o periodos infinitos)
-    df_fft = df_fft[(df_fft["Frecuencia"] > 0.005) & (df_fft["Potencia"] > 100)]
+
+    # rfft batch de todas las series (sin componente DC), periodos = 1 / frecuencia
+    with etapa("temporal.fft.datos"):
+        df_fft = espectro_serie(espectros, seleccion)
 
     # Gráfica del Espectro
-    fig_fft = px.bar(
-        df_fft, 
-        x="Periodo (Dias)", 
-        y="Potencia", 
-        title="Amplitud Espectral (Fuerza de los Ciclos)",
-        labels={"Potencia": "Amplitud", "Periodo (Dias)": "Periodo del Ciclo (Dias)"}
-    )
-    # Ajustamos el eje X para ver mejor los ciclos cortos (semanales)
-    fig_fft.update_layout(xaxis_range=[0, 35]) 
-    st.plotly_chart(fig_fft, use_container_width=True)
+    with etapa("temporal.fft.grafica"):
+        fig_fft = px.bar(
+            df_fft, 
+            x="Periodo (Dias)", 
+            y="Potencia", 
+            title="Amplitud Espectral (Fuerza de los Ciclos)",
+            labels={"Potencia": "Amplitud", "Periodo (Dias)": "Periodo del Ciclo (Dias)"}
+        )
+        # Ajustamos el eje X para ver mejor los ciclos cortos (semanales)
+        fig_fft.update_layout(xaxis_range=[0, 35]) 
+        st.plotly_chart(fig_fft, use_container_width=True)
 
     # --- 3. RESULTADOS E INTERPRETACION ---
     if not df_fft.empty:
@@ -111,3 +143,23 @@ def show_temporal():
 
     else:
         st.warning("No se encontraron ciclos claros con suficiente potencia.")
+
+    st.divider()
+
+    # --- 4. COMPARATIVA DE CICLOS ENTRE LINEAS ---
+    st.subheader("Ciclos Dominantes por Serie")
+    with etapa("temporal.ciclos.datos"):
+        df_ciclos = ciclos_dominantes(espectros)
+    if not df_ciclos.empty:
+        fig_ciclos = px.scatter(
+            df_ciclos,
+            x="Periodo (Dias)",
+            y="Serie",
+            size="Potencia",
+            color="Rango",
+            title="Top 3 ciclos de cada serie (tamaño = amplitud)",
+            color_continuous_scale="Blues_r"
+        )
+        fig_ciclos.update_layout(template="plotly_white", xaxis_range=[0, 35])
+        st.plotly_chart(fig_ciclos, use_container_width=True)
+        st.dataframe(df_ciclos, use_container_width=True, hide_index=True)